@@ -5,11 +5,19 @@ Handles execution of specific commands.
 """
 
 import logging
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from src.core.config import ConfigManager
 from src.metrics.prometheus_metrics import MetricsManager
 from src.sources.zim.zim_factory import ZimFactory
 
+# Upper bound on sources checked for updates at the same time
+_MAX_CHECK_WORKERS = 8
+# Upper bound on downloads hashed at the same time in the background
+_MAX_CHECKSUM_WORKERS = 2
+
 class CommandExecutor:
     """
     Executes commands for the knowledge archival system.
@@ -49,35 +57,84 @@ class CommandExecutor:
             self.logger.warning(">>> CommandExecutor::download_sources No ZIM sources configured")
             return False
         
-        # Track success of all downloads
-        all_success = True
-        
-        # Download each configured source
-        for source_config in zim_sources:
-            source_name = source_config.get("name")
-            self.logger.info(">> CommandExecutor::download_sources Will process source: %s", source_name)
+        # Hashing a download only overlaps with other work when further sources follow it. Workers are
+        # spawned rather than forked, the metrics server thread is already running in this process
+        use_checksum_pool = len(zim_sources) > 1 and any(source.get("record_zim_sha256", False) for source in zim_sources)
+        checksum_pool = ProcessPoolExecutor(
+            max_workers=min(_MAX_CHECKSUM_WORKERS, len(zim_sources)),
+            mp_context=multiprocessing.get_context("spawn")
+        ) if use_checksum_pool else nullcontext()
+        
+        # Leaving the block waits for every checksum the pool ran
+        with checksum_pool as checksum_executor:
+            # Track success of all downloads
+            all_success = True
             
-            if not source_name:
-                self.logger.warning(">>> CommandExecutor::download_sources Source missing name, skipping")
-                all_success = False
-                continue
+            # Create a connector for each configured source
+            connectors = []
+            for source_config in zim_sources:
+                source_name = source_config.get("name")
+                self.logger.info(">> CommandExecutor::download_sources Will process source: %s", source_name)
+                
+                if not source_name:
+                    self.logger.warning(">>> CommandExecutor::download_sources Source missing name, skipping")
+                    all_success = False
+                    continue
+                    
+                self.logger.info(">> CommandExecutor::download_sources Processing source: %s", source_name)
                 
-            self.logger.info(">> CommandExecutor::download_sources Processing source: %s", source_name)
+                # Create ZIM connector for this source
+                zim_connector = ZimFactory.create_connector_from_config(
+                    self.config,
+                    self.metrics_manager,
+                    source_config,
+                    checksum_executor
+                )
+                connectors.append((source_name, zim_connector))
+            
+            if connectors:
+                all_success = self._update_connectors(connectors, force_update) and all_success
+                
+                # Record the background checksums before the pool shuts down. The downloads were verified
+                # already, so a failed checksum does not fail the command
+                for source_name, zim_connector in connectors:
+                    if not zim_connector.wait_for_checksum():
+                        self.logger.warning(">>> CommandExecutor::download_sources %s checksum not recorded", source_name)
+        
+        return all_success
+    
+    def _update_connectors(self, connectors, force_update: bool) -> bool:
+        """
+        Check the given sources for updates concurrently and download the ones that have one.
+        
+        Args:
+            connectors: List of (source_name, connector) tuples
+            force_update: If True, force download regardless of version comparison
             
-            # Create ZIM connector for this source
-            zim_connector = ZimFactory.create_connector_from_config(
-                self.config,
-                self.metrics_manager,
-                source_config
-            )
+        Returns:
+            True if all downloads completed successfully, False if any download failed
+        """
+        all_success = True
+        
+        # Check every source concurrently, so polling waits for the slowest server instead of all of them in turn
+        with ThreadPoolExecutor(max_workers=min(_MAX_CHECK_WORKERS, len(connectors))) as executor:
+            updates_available = list(executor.map(
+                lambda connector: connector[1].check_for_update(force=force_update), connectors
+            ))
+        
+        # Download the sources that have an update one at a time, they share the bandwidth and disk.
+        # Each connector acts on the check it just made, so every source is checked once per poll
+        for (source_name, zim_connector), update_available in zip(connectors, updates_available):
+            if not update_available:
+                self.logger.info(">> CommandExecutor::_update_connectors %s is up to date", source_name)
+                continue
             
-            # Download this source
-            success = zim_connector.update_if_needed(force=force_update)
+            success = zim_connector.update_if_needed(force=force_update, already_checked=True)
             
             if success:
-                self.logger.info(">> CommandExecutor::download_sources %s download completed successfully", source_name)
+                self.logger.info(">> CommandExecutor::_update_connectors %s download completed successfully", source_name)
             else:
-                self.logger.error(">>>> CommandExecutor::download_sources %s download failed", source_name)
+                self.logger.error(">>>> CommandExecutor::_update_connectors %s download failed", source_name)
                 all_success = False
         
         return all_success
@@ -115,7 +172,8 @@ class CommandExecutor:
             self.logger.error(">>>> CommandExecutor::download_source Source not found: %s", source_name)
             return False
             
-        # Create ZIM connector for this source
+        # Create ZIM connector for this source. Nothing runs alongside a single source's checksum,
+        # so it is computed inline instead of in a worker process
         zim_connector = ZimFactory.create_connector_from_config(
             self.config,
             self.metrics_manager,
@@ -129,6 +187,10 @@ class CommandExecutor:
             self.logger.info(">> CommandExecutor::download_source %s download completed successfully", source_name)
         else:
             self.logger.error(">>>> CommandExecutor::download_source %s download failed", source_name)
+        
+        # Record the checksum, the download was verified already so a failed one does not fail the command
+        if not zim_connector.wait_for_checksum():
+            self.logger.warning(">>> CommandExecutor::download_source %s checksum not recorded", source_name)
             
         return success
     
@@ -4,7 +4,7 @@ Download manager interface for the knowledge archival system.
 Defines the contract for downloading operations.
 """
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 
 class IDownloadManager(ABC):
     """Interface for downloading operations."""
@@ -30,12 +30,14 @@ class IDownloadManager(ABC):
         pass
         
     @abstractmethod
-    def download_file(self, url: str) -> bool:
+    def download_file(self, url: str, verify: Optional[Callable[[str], bool]] = None) -> bool:
         """
         Download a file from the specified URL.
         
         Args:
             url: URL to download from
+            verify: Called with the path of the complete download before it is moved into place
+                    and recorded, a file it rejects is discarded
             
         Returns:
             True if download was successful, False otherwise
@@ -33,13 +33,31 @@ class IMetadataManager(ABC):
         pass
         
     @abstractmethod
-    def update_download_metadata(self, filename: str, file_size: int) -> bool:
+    def update_download_metadata(self, filename: str, file_size: int,
+                                 etag: Optional[str] = None,
+                                 last_modified: Optional[str] = None) -> bool:
         """
         Update metadata with new download information.
         
         Args:
             filename: Name of the downloaded file
             file_size: Size of the downloaded file in bytes
+            etag: ETag header returned by the server, if any
+            last_modified: Last-Modified header returned by the server, if any
+            
+        Returns:
+            True if update was successful, False otherwise
+        """
+        pass
+        
+    @abstractmethod
+    def update_download_checksum(self, filename: str, sha256: str) -> bool:
+        """
+        Record the checksum of a previously downloaded file.
+        
+        Args:
+            filename: Name of the downloaded file
+            sha256: Hex SHA-256 digest of the file
             
         Returns:
             True if update was successful, False otherwise
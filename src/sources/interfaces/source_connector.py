@@ -9,12 +9,13 @@ class ISourceConnector(ABC):
     """Base interface for all knowledge source connectors."""
     
     @abstractmethod
-    def update_if_needed(self, force: bool = False) -> bool:
+    def update_if_needed(self, force: bool = False, already_checked: bool = False) -> bool:
         """
         Check for updates and download if available.
         
         Args:
             force: If True, force download regardless of version comparison
+            already_checked: If True, act on the result of the last check_for_update instead of checking again
             
         Returns:
             True if the process completed successfully, False otherwise
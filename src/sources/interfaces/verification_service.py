@@ -4,6 +4,7 @@ Verification service interface for the knowledge archival system.
 Defines the contract for verification operations.
 """
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 
 class IVerificationService(ABC):
     """Interface for verification operations."""
@@ -19,4 +20,18 @@ class IVerificationService(ABC):
         Returns:
             True if verification passed, False otherwise
         """
+        pass
+        
+    @abstractmethod
+    def start_checksum(self, file_path: str) -> Future:
+        """
+        Start computing the checksum of a file in the background.
+        Callers wait for the returned future before the executor running it is shut down.
+        
+        Args:
+            file_path: Path to the file to checksum
+            
+        Returns:
+            Future resolving to the hex digest of the file
+        """
         pass
\ No newline at end of file
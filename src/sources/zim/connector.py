@@ -3,8 +3,10 @@
 ZIM connector for the knowledge archival system.
 Orchestrates the ZIM file download, backup, and verification process.
 """
+import os
 import logging
-from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 
 from src.sources.interfaces.source_connector import ISourceConnector
 from src.sources.interfaces.metadata_manager import IMetadataManager
@@ -23,7 +25,9 @@ class ZimConnector(ISourceConnector):
                  download_manager: IDownloadManager,
                  backup_manager: IBackupManager,
                  verification_service: IVerificationService,
-                 source_name: str = "zim"):
+                 source_name: str = "zim",
+                 parallel_backup_download: bool = True,
+                 record_sha256: bool = False):
         """
         Initialize the ZimConnector.
         
@@ -35,11 +39,15 @@ class ZimConnector(ISourceConnector):
             backup_manager: Backup manager component
             verification_service: Verification service component
             source_name: Name of the source (for metrics and logging)
+            parallel_backup_download: If True, run the backup and the download concurrently
+            record_sha256: If True, hash each verified download and record its SHA-256 in the metadata
         """
         self.logger = logging.getLogger(__name__)
         self.config = config
         self.metrics_manager = metrics_manager
         self.source_name = source_name
+        self.parallel_backup_download = parallel_backup_download
+        self.record_sha256 = record_sha256
         
         # Component dependencies through interfaces
         self.metadata_manager = metadata_manager
@@ -54,6 +62,12 @@ class ZimConnector(ISourceConnector):
         
         # Current download URL (set during check_for_update)
         self.download_url = None
+        
+        # Remote file, URL and local target resolved by a positive check_for_update
+        self._resolved: Optional[Dict[str, str]] = None
+        
+        # Filename and background checksum of the last verified download, until collected
+        self._pending_checksum: Optional[Tuple[str, Future]] = None
     
     def check_for_update(self, force: bool = False) -> bool:
         """
@@ -71,6 +85,8 @@ class ZimConnector(ISourceConnector):
         if self.check_count_metric:
             self.check_count_metric.inc()
         
+        self._resolved = None
+        
         try:
             # Find the latest remote file
             latest_file, download_url = self.download_manager.get_latest_remote_file()
@@ -83,10 +99,16 @@ class ZimConnector(ISourceConnector):
             
             # Store the download URL for later use
             self.download_url = download_url
+            resolved = {
+                'url': download_url,
+                'filename': latest_file,
+                'target_path': self.download_manager.get_file_path(latest_file)
+            }
             
             # If force download is enabled, skip version checks
             if force:
                 self.logger.info(">> ZimConnector::check_for_update Force download enabled, update needed")
+                self._resolved = resolved
                 return True
             
             # Check if we have any local file
@@ -94,11 +116,13 @@ class ZimConnector(ISourceConnector):
             
             if not latest_local_file:
                 self.logger.info(">> ZimConnector::check_for_update No local file found, update needed")
+                self._resolved = resolved
                 return True
             
             # Check if the remote version is newer than what we have
             if self.download_manager.is_newer_version(latest_file):
                 self.logger.info(">> ZimConnector::check_for_update Newer version available, update needed")
+                self._resolved = resolved
                 return True
                 
             self.logger.info(">> ZimConnector::check_for_update No update needed, already have latest version")
@@ -109,47 +133,115 @@ class ZimConnector(ISourceConnector):
             # In case of error, we return False to avoid unnecessary downloads
             return False
     
-    def update_if_needed(self, force: bool = False) -> bool:
+    def update_if_needed(self, force: bool = False, already_checked: bool = False) -> bool:
         """
         Check for ZIM file updates and download if available.
         Handles the entire update process including backup and verification.
         
         Args:
             force: If True, force download regardless of version comparison
+            already_checked: If True, act on the result of the last check_for_update instead of checking again
             
         Returns:
             True if the process completed successfully, False otherwise
         """
         try:
-            # Check if an update is available
-            if not self.check_for_update(force=force):
+            # Make sure the checksum from a previous update has finished and is recorded
+            self.wait_for_checksum()
+            
+            # Check if an update is available, reusing the decision and target of a check the caller just made
+            if already_checked:
+                update_available = self._resolved is not None
+            else:
+                update_available = self.check_for_update(force=force)
+            
+            if not update_available:
                 self.logger.info(">> ZimConnector::update_if_needed No update needed")
                 return True
             
-            # Backup current version before downloading
-            if not self.backup_manager.backup_current_version():
-                self.logger.error(">>>> ZimConnector::update_if_needed Backup failed, aborting update")
-                return False
-            
-            # Download the new version
-            if not self.download_manager.download_file(self.download_url):
-                self.logger.error(">>>> ZimConnector::update_if_needed Download failed")
-                if self.download_failures_metric:
-                    self.download_failures_metric.inc()
-                return False
+            # Backup current version and download the new one
+            if self.parallel_backup_download:
+                if not self._backup_and_download_parallel():
+                    return False
+            else:
+                if not self.backup_manager.backup_current_version():
+                    self.logger.error(">>>> ZimConnector::update_if_needed Backup failed, aborting update")
+                    return False
+                
+                if not self.download_manager.download_file(self.download_url, self.verification_service.verify_download):
+                    self.logger.error(">>>> ZimConnector::update_if_needed Download failed")
+                    if self.download_failures_metric:
+                        self.download_failures_metric.inc()
+                    return False
             
-            # Get the downloaded file path
-            target_filename = self.download_url.split('/')[-1]
-            file_path = self.download_manager.get_file_path(target_filename)
+            # Downloaded file path, already resolved by check_for_update.
+            # It was verified before being moved there, a rejected file never replaces the current one
+            file_path = self._resolved['target_path']
             
-            # Verify the downloaded file
-            if not self.verification_service.verify_download(file_path):
-                self.logger.error(">>>> ZimConnector::update_if_needed Verification failed")
-                return False
+            # Hash the file, in the background if there is a pool for it, the caller collects it with wait_for_checksum
+            if self.record_sha256:
+                try:
+                    self._pending_checksum = (
+                        os.path.basename(file_path),
+                        self.verification_service.start_checksum(file_path)
+                    )
+                except Exception as e:
+                    self.logger.warning(">>> ZimConnector::update_if_needed Could not start checksum: %s", str(e))
             
             self.logger.info(">> ZimConnector::update_if_needed Update completed successfully")
             return True
             
         except Exception as e:
             self.logger.error(">>>> ZimConnector::update_if_needed Update process failed: %s", str(e))
-            return False
\ No newline at end of file
+            return False
+    
+    def _backup_and_download_parallel(self) -> bool:
+        """
+        Run the backup of the current version and the download of the new one concurrently.
+        The download writes to a temporary file and only renames it at the end, so the
+        backup always reads the pre-existing file.
+        
+        Returns:
+            True if both the backup and the download succeeded, False otherwise
+        """
+        self.logger.info(">> ZimConnector::_backup_and_download_parallel Running backup and download concurrently")
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            backup_future = executor.submit(self.backup_manager.backup_current_version)
+            download_future = executor.submit(self.download_manager.download_file, self.download_url,
+                                              self.verification_service.verify_download)
+            backup_ok = backup_future.result()
+            download_ok = download_future.result()
+        
+        if not download_ok:
+            self.logger.error(">>>> ZimConnector::_backup_and_download_parallel Download failed")
+            if self.download_failures_metric:
+                self.download_failures_metric.inc()
+        if not backup_ok:
+            self.logger.error(">>>> ZimConnector::_backup_and_download_parallel Backup failed, aborting update")
+        
+        return backup_ok and download_ok
+    
+    def wait_for_checksum(self) -> bool:
+        """
+        Wait for the background checksum of the last update, if any, and record it in the metadata.
+        The download was already verified, so a failed checksum is only logged.
+        
+        Returns:
+            True if there was no checksum pending or it was computed and recorded, False otherwise
+        """
+        if self._pending_checksum is None:
+            return True
+        
+        filename, future = self._pending_checksum
+        self._pending_checksum = None
+        if not future.done():
+            self.logger.info(">> ZimConnector::wait_for_checksum Waiting for the checksum of %s", filename)
+        try:
+            sha256 = future.result()
+        except Exception as e:
+            self.logger.warning(">>> ZimConnector::wait_for_checksum Checksum of %s failed: %s", filename, str(e))
+            return False
+        
+        self.logger.info(">> ZimConnector::wait_for_checksum SHA-256 of %s: %s", filename, sha256)
+        return self.metadata_manager.update_download_checksum(filename, sha256)
@@ -4,13 +4,46 @@ Generic ZIM file backup manager implementation.
 Handles backing up ZIM files from any source.
 """
 import os
+import errno
+import fcntl
+import heapq
+import mmap
+import re
 import logging
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from src.sources.interfaces.backup_manager import IBackupManager
 from src.sources.interfaces.download_manager import IDownloadManager
 
+
+# Backup filenames produced by backup_current_version: <name>_backup_<YYYYMMDDHHMMSS>[_<n>].zim
+# The numeric suffix only appears when several backups are made within the same second
+_BACKUP_RE = re.compile(r'_backup_(\d{14})(?:_(\d+))?\.zim\Z')
+
+# Buffer size for the userspace copy used when no kernel copy is available
+_COPY_BUFSIZE = 4 * 1024 * 1024
+
+# Slice size used when comparing a backup against its source
+_COMPARE_CHUNK = 16 * 1024 * 1024
+
+# Upper bound of concurrent unlinks when pruning old backups
+_MAX_REMOVE_WORKERS = 8
+
+# Linux ioctl sharing the extents of one file with another (copy-on-write clone)
+_FICLONE = 0x40049409
+
+# Errors meaning a hardlink cannot be made here, any other error is not retried with a copy
+_LINK_GIVEUP_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP)
+
+# Errors meaning a kernel copy primitive cannot handle these files
+_FAST_COPY_GIVEUP_ERRNOS = (errno.EINVAL, errno.ENOTSUP, errno.ENOSYS, errno.EXDEV, errno.ENOTSOCK)
+
+
+class _GiveupOnFastCopy(Exception):
+    """Raised when a kernel-level copy is not possible and a slower copy must be used."""
+
 class ZimBackupManager(IBackupManager):
     """Manages backups of ZIM files from any source."""
     
@@ -45,7 +78,13 @@ class ZimBackupManager(IBackupManager):
         """
         latest_local_file = self.download_manager.get_latest_local_file()
         
-        if not latest_local_file or not os.path.exists(latest_local_file):
+        # A single stat answers both "does it exist" and "how big is it"
+        try:
+            source_size = os.stat(latest_local_file).st_size if latest_local_file else None
+        except FileNotFoundError:
+            source_size = None
+        
+        if source_size is None:
             self.logger.info(">> ZimBackupManager::backup_current_version No existing file to backup")
             return True
         
@@ -53,19 +92,33 @@ class ZimBackupManager(IBackupManager):
             # Create timestamped backup filename
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             original_filename = os.path.basename(latest_local_file)
-            backup_filename = f"{os.path.splitext(original_filename)[0]}_backup_{timestamp}.zim"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
+            backup_stem = f"{os.path.splitext(original_filename)[0]}_backup_{timestamp}"
             
-            self.logger.info(
-                ">> ZimBackupManager::backup_current_version Backing up to %s", 
-                backup_path
-            )
-            
-            # Copy the file
-            shutil.copy2(latest_local_file, backup_path)
+            # Link, clone or copy the file, the backup is always a new file so an existing one is never overwritten
+            attempt = 0
+            while True:
+                suffix = f"_{attempt}" if attempt else ""
+                backup_path = os.path.join(self.backup_dir, f"{backup_stem}{suffix}.zim")
+                self.logger.info(
+                    ">> ZimBackupManager::backup_current_version Backing up to %s", 
+                    backup_path
+                )
+                try:
+                    method = self._link_or_copy(latest_local_file, backup_path)
+                    break
+                except FileExistsError:
+                    self.logger.warning(">>> ZimBackupManager::backup_current_version Backup %s already exists", backup_path)
+                    attempt += 1
             
             # Verify backup
-            if os.path.exists(backup_path) and os.path.getsize(backup_path) == os.path.getsize(latest_local_file):
+            try:
+                backup_size = os.stat(backup_path).st_size
+            except FileNotFoundError:
+                self.logger.error(">>>> ZimBackupManager::backup_current_version Backup verification failed, file missing")
+                return False
+            
+            # Links and clones share the source data, only a real copy needs a content check
+            if backup_size == source_size and (method != 'copy' or self._contents_match(latest_local_file, backup_path)):
                 self.logger.info(">> ZimBackupManager::backup_current_version Backup successful")
                 
                 # Update metrics
@@ -75,7 +128,7 @@ class ZimBackupManager(IBackupManager):
                 if backup_count_metric:
                     backup_count_metric.inc()
                 if backup_size_metric:
-                    backup_size_metric.set(os.path.getsize(backup_path))
+                    backup_size_metric.set(backup_size)
                 
                 # Clean up old backups
                 self.cleanup_old_backups()
@@ -83,6 +136,7 @@ class ZimBackupManager(IBackupManager):
                 return True
             else:
                 self.logger.error(">>>> ZimBackupManager::backup_current_version Backup verification failed")
+                os.remove(backup_path)
                 return False
                 
         except Exception as e:
@@ -95,24 +149,215 @@ class ZimBackupManager(IBackupManager):
                 
             return False
     
+    def _contents_match(self, src: str, dst: str) -> bool:
+        """
+        Compare a copied backup byte for byte against its source through memory maps.
+        
+        Args:
+            src: Path of the original file
+            dst: Path of the backup
+            
+        Returns:
+            True if both files have identical contents, False otherwise
+        """
+        with open(src, 'rb') as s, open(dst, 'rb') as d:
+            src_stat = os.fstat(s.fileno())
+            dst_stat = os.fstat(d.fileno())
+            if src_stat.st_size != dst_stat.st_size:
+                return False
+            if src_stat.st_size == 0:
+                return True
+            
+            with mmap.mmap(s.fileno(), 0, access=mmap.ACCESS_READ) as src_map, \
+                    mmap.mmap(d.fileno(), 0, access=mmap.ACCESS_READ) as dst_map:
+                for offset in range(0, src_stat.st_size, _COMPARE_CHUNK):
+                    end = offset + _COMPARE_CHUNK
+                    if src_map[offset:end] != dst_map[offset:end]:
+                        self.logger.error(
+                            ">>>> ZimBackupManager::_contents_match Backup differs from source near offset %d", offset
+                        )
+                        return False
+        return True
+    
+    def _link_or_copy(self, src: str, dst: str) -> str:
+        """
+        Create the backup without copying data whenever possible.
+        ZIM files are never modified in place, so a hardlink or a copy-on-write
+        clone is as good as a copy and costs no space or bandwidth.
+        The backup is always created as a new file, an existing dst is left untouched.
+        
+        Args:
+            src: Path of the file to back up
+            dst: Path of the backup
+            
+        Returns:
+            'link', 'reflink' or 'copy', depending on how the backup was created
+            
+        Raises:
+            FileExistsError: If dst already exists
+        """
+        try:
+            os.link(src, dst)
+            self.logger.info(">> ZimBackupManager::_link_or_copy Backup created as hardlink")
+            return 'link'
+        except OSError as e:
+            if e.errno not in _LINK_GIVEUP_ERRNOS:
+                raise
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("> ZimBackupManager::_link_or_copy Hardlink not possible: %s", str(e))
+        
+        try:
+            try:
+                self._reflink_copy(src, dst)
+                self.logger.info(">> ZimBackupManager::_link_or_copy Backup created as reflink clone")
+                return 'reflink'
+            except _GiveupOnFastCopy:
+                self.logger.debug("> ZimBackupManager::_link_or_copy Reflink not possible, copying data")
+            
+            self._fast_copy(src, dst)
+            return 'copy'
+        except FileExistsError:
+            raise
+        except Exception:
+            # dst was created by this call, a partial copy must not be mistaken for a backup
+            self._remove_quietly(dst)
+            raise
+    
+    def _remove_quietly(self, path: str) -> None:
+        """
+        Remove a file if it exists, ignoring errors.
+        
+        Args:
+            path: Path of the file to remove
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def _reflink_copy(self, src: str, dst: str) -> None:
+        """
+        Clone a file with the FICLONE ioctl, sharing its extents copy-on-write.
+        
+        Args:
+            src: Path of the file to clone
+            dst: Path of the clone
+            
+        Raises:
+            _GiveupOnFastCopy: If the filesystem cannot clone these files, dst is not left behind
+            FileExistsError: If dst already exists
+        """
+        with open(src, 'rb') as s, open(dst, 'xb') as d:
+            try:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            except OSError as e:
+                self._remove_quietly(dst)
+                raise _GiveupOnFastCopy() from e
+        shutil.copystat(src, dst)
+    
+    def _fast_copy(self, src: str, dst: str) -> None:
+        """
+        Copy a file using the fastest mechanism available, preserving its metadata.
+        Tries copy_file_range, then sendfile, then a buffered userspace copy.
+        
+        Args:
+            src: Path of the file to copy
+            dst: Path of the copy
+        """
+        try:
+            self._copy_file_range_copy(src, dst)
+        except _GiveupOnFastCopy:
+            try:
+                self._sendfile_copy(src, dst)
+            except _GiveupOnFastCopy:
+                self.logger.debug("> ZimBackupManager::_fast_copy Kernel copy unavailable, using buffered copy")
+                with open(src, 'rb') as s, open(dst, 'xb') as d:
+                    shutil.copyfileobj(s, d, _COPY_BUFSIZE)
+        shutil.copystat(src, dst)
+    
+    def _copy_file_range_copy(self, src: str, dst: str) -> None:
+        """
+        Copy a file in the kernel with os.copy_file_range.
+        On filesystems that support it this is a server-side or reflink copy.
+        
+        Args:
+            src: Path of the file to copy
+            dst: Path of the copy
+            
+        Raises:
+            _GiveupOnFastCopy: If copy_file_range is not supported for these files, dst is not left behind
+            FileExistsError: If dst already exists
+        """
+        if not hasattr(os, "copy_file_range"):
+            raise _GiveupOnFastCopy()
+        
+        with open(src, 'rb') as s, open(dst, 'xb') as d:
+            size = os.fstat(s.fileno()).st_size
+            copied = 0
+            while copied < size:
+                try:
+                    sent = os.copy_file_range(s.fileno(), d.fileno(), size - copied)
+                except OSError as e:
+                    if copied == 0 and e.errno in _FAST_COPY_GIVEUP_ERRNOS:
+                        self._remove_quietly(dst)
+                        raise _GiveupOnFastCopy() from e
+                    raise
+                if sent == 0:
+                    break
+                copied += sent
+    
+    def _sendfile_copy(self, src: str, dst: str) -> None:
+        """
+        Copy a file in the kernel with os.sendfile, without a userspace buffer.
+        
+        Args:
+            src: Path of the file to copy
+            dst: Path of the copy
+            
+        Raises:
+            _GiveupOnFastCopy: If sendfile is not supported for these files, dst is not left behind
+            FileExistsError: If dst already exists
+        """
+        if not hasattr(os, "sendfile"):
+            raise _GiveupOnFastCopy()
+        
+        with open(src, 'rb') as s, open(dst, 'xb') as d:
+            offset = 0
+            size = os.fstat(s.fileno()).st_size
+            while offset < size:
+                try:
+                    sent = os.sendfile(d.fileno(), s.fileno(), offset, size - offset)
+                except OSError as e:
+                    if offset == 0 and e.errno in _FAST_COPY_GIVEUP_ERRNOS:
+                        self._remove_quietly(dst)
+                        raise _GiveupOnFastCopy() from e
+                    raise
+                if sent == 0:
+                    break
+                offset += sent
+    
     def cleanup_old_backups(self) -> None:
         """Remove old backup files, keeping only the most recent ones."""
         try:
-            # List all backup files
+            # List all backup files with the timestamp embedded in their name
             backup_files = []
             for filename in os.listdir(self.backup_dir):
-                if filename.endswith('.zim') and 'backup' in filename:
-                    full_path = os.path.join(self.backup_dir, filename)
-                    backup_files.append((full_path, os.path.getmtime(full_path)))
+                match = _BACKUP_RE.search(filename)
+                if match:
+                    backup_files.append((os.path.join(self.backup_dir, filename), (match.group(1), int(match.group(2) or 0))))
                     
-            # Sort by modification time (newest first)
-            backup_files.sort(key=lambda x: x[1], reverse=True)
-            
-            # Remove old backups
-            if len(backup_files) > self.max_backups:
-                for file_path, _ in backup_files[self.max_backups:]:
+            # Remove old backups, picking only the oldest ones instead of sorting them all
+            # (YYYYMMDDHHMMSS sorts chronologically as text, the suffix orders backups within a second)
+            excess = len(backup_files) - self.max_backups
+            if excess > 0:
+                doomed = heapq.nsmallest(excess, backup_files, key=lambda x: x[1])
+                doomed_paths = [file_path for file_path, _ in doomed]
+                for file_path in doomed_paths:
                     self.logger.info(">> ZimBackupManager::cleanup_old_backups Removing old backup: %s", file_path)
-                    os.remove(file_path)
+                
+                # Unlinks release the GIL, so slow filesystems are hit concurrently
+                with ThreadPoolExecutor(max_workers=min(_MAX_REMOVE_WORKERS, len(doomed_paths))) as executor:
+                    list(executor.map(os.remove, doomed_paths))
                     
         except Exception as e:
             self.logger.error(">>>> ZimBackupManager::cleanup_old_backups Error cleaning up old backups: %s", str(e))
\ No newline at end of file
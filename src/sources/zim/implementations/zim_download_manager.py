@@ -6,25 +6,63 @@ Handles downloading of ZIM files from any source.
 import os
 import re
 import time
+import shutil
 import logging
+import threading
 import requests
-from datetime import datetime
-from typing import Optional, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional, Pattern, Tuple, Union
 
 from src.sources.interfaces.download_manager import IDownloadManager
 from src.sources.interfaces.metadata_manager import IMetadataManager
 
+# Year and month embedded in ZIM filenames, e.g. wikipedia_en_all_maxi_2024-01.zim
+_VERSION_RE = re.compile(r'_(\d{4})-(\d{2})\.')
+# Year and month of a version string stored in the metadata, e.g. 2024-01
+_METADATA_VERSION_RE = re.compile(r'(\d{4})-(\d{2})')
+
+# Directory listings are scanned in chunks of this many bytes
+_LISTING_CHUNK = 64 * 1024
+# Characters carried over between listing chunks so an href split at a boundary is still found
+_LISTING_OVERLAP = 1024
+
+# Downloads are streamed in chunks of this many bytes
+_DOWNLOAD_CHUNK = 1024 * 1024
+# Bounds and starting point of the read size tuned to the throughput of a single-stream download
+_MIN_STREAM_CHUNK = 64 * 1024
+_MAX_STREAM_CHUNK = 8 * 1024 * 1024
+_INITIAL_STREAM_CHUNK = 256 * 1024
+# The read size is re-evaluated every time this many more bytes have been downloaded
+_TUNE_INTERVAL = 200 * 1024 * 1024
+# Throughput in bytes per second above which the read size doubles, and below which it halves
+_FAST_RATE = 200 * 1024 * 1024
+_SLOW_RATE = 10 * 1024 * 1024
+# Progress is logged every time this many more bytes have been downloaded
+_PROGRESS_INTERVAL = 100 * _DOWNLOAD_CHUNK
+# Number of byte ranges fetched concurrently when the server supports range requests
+_RANGE_SEGMENTS = 8
+# Suffixes of in-progress downloads and of the validator saved next to them when they were started
+_PARTIAL_SUFFIX = '.downloading'
+_VALIDATOR_SUFFIX = '.validator'
+# Pooled connections per host, enough for every range worker plus the listing and probe requests
+_POOL_SIZE = 2 * _RANGE_SEGMENTS
+
+class _RangeNotHonored(Exception):
+    """Raised when a ranged request is answered with something other than the requested range."""
+
 class ZimDownloadManager(IDownloadManager):
     """Manages downloading of ZIM files from any source."""
     
-    def __init__(self, source_url: str, file_pattern: str, data_dir: str, 
+    def __init__(self, source_url: str, file_pattern: Union[Pattern[str], str], data_dir: str, 
                  metadata_manager: IMetadataManager, metrics_manager, source_name: str = "zim"):
         """
         Initialize the download manager.
         
         Args:
             source_url: URL to the ZIM file source
-            file_pattern: Regex pattern to match ZIM files
+            file_pattern: Regex pattern to match ZIM files, compiled or as a string
             data_dir: Directory to store downloaded files
             metadata_manager: Metadata manager instance
             metrics_manager: Metrics manager instance
@@ -34,7 +72,11 @@ class ZimDownloadManager(IDownloadManager):
         
         # Configuration
         self.source_url = source_url
-        self.file_pattern = file_pattern
+        if isinstance(file_pattern, str):
+            file_pattern = re.compile(file_pattern)
+        self.file_pattern_re = file_pattern
+        self.file_pattern = file_pattern.pattern
+        self._href_pattern = re.compile(f'href="({self.file_pattern})"')
         self.data_dir = data_dir
         self.source_name = source_name
         
@@ -52,6 +94,28 @@ class ZimDownloadManager(IDownloadManager):
         self.download_time_metric = self.metrics_manager.get_metric(f"{source_name}_last_download_time_seconds")
         self.download_failures_metric = self.metrics_manager.get_metric(f"{source_name}_download_failures")
         
+        # One session for all requests, so connections and TLS sessions are reused
+        self._session = self._create_session()
+        
+        # Validators and result of the last parsed directory listing, for conditional requests
+        self._index_etag: Optional[str] = None
+        self._index_last_modified: Optional[str] = None
+        self._index_result: Optional[Tuple[str, str]] = None
+        
+    def _create_session(self) -> requests.Session:
+        """
+        Create the HTTP session with a connection pool sized for parallel range downloads.
+        
+        Returns:
+            Session retrying transient gateway errors
+        """
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+        
     def get_latest_remote_file(self) -> Tuple[Optional[str], Optional[str]]:
         """
         Find the latest available ZIM file from the remote server based on the file pattern.
@@ -60,24 +124,47 @@ class ZimDownloadManager(IDownloadManager):
             Tuple of (file_name, full_url) if found, (None, None) otherwise
         """
         try:
-            # Get directory listing from the server
-            response = requests.get(self.source_url, timeout=30)
-            response.raise_for_status()
-            
-            content = response.text
+            # Ask the server to skip the listing if it has not changed since the last parse
+            headers = {}
+            if self._index_result:
+                if self._index_etag:
+                    headers['If-None-Match'] = self._index_etag
+                if self._index_last_modified:
+                    headers['If-Modified-Since'] = self._index_last_modified
             
-            # Extract filenames matching our pattern
-            pattern = re.compile(f'href="({self.file_pattern})"')
-            matches = pattern.findall(content)
+            # Stream the directory listing from the server
+            with self._session.get(self.source_url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code == 304 and self._index_result:
+                    self.logger.info(">> ZimDownloadManager::get_latest_remote_file Listing unchanged, latest file: %s", self._index_result[0])
+                    return self._index_result
+                    
+                response.raise_for_status()
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                response.encoding = response.encoding or 'utf-8'
+                
+                # Keep a running max of matching filenames, names sort by the date they include
+                latest_file = None
+                tail = ''
+                for chunk in response.iter_content(chunk_size=_LISTING_CHUNK, decode_unicode=True):
+                    buffer = tail + chunk
+                    last_end = 0
+                    for match in self._href_pattern.finditer(buffer):
+                        if latest_file is None or match.group(1) > latest_file:
+                            latest_file = match.group(1)
+                        last_end = match.end()
+                    tail = buffer[max(last_end, len(buffer) - _LISTING_OVERLAP):]
             
-            if not matches:
+            if not latest_file:
                 self.logger.warning(">>> ZimDownloadManager::get_latest_remote_file No files matching pattern: %s", self.file_pattern)
                 return None, None
                 
-            # Sort files by name (which includes the date) to get the latest
-            latest_file = sorted(matches)[-1]
             full_url = f"{self.source_url}{latest_file}"
             
+            self._index_etag = etag
+            self._index_last_modified = last_modified
+            self._index_result = (latest_file, full_url)
+            
             self.logger.info(">> ZimDownloadManager::get_latest_remote_file Found latest file: %s", latest_file)
             return latest_file, full_url
             
@@ -93,21 +180,21 @@ class ZimDownloadManager(IDownloadManager):
             Path to the latest local file if found, None otherwise
         """
         try:
-            # Create a regex pattern from the file pattern
-            pattern_str = self.file_pattern.replace('[0-9]{4}', '\\d{4}').replace('[0-9]{2}', '\\d{2}')
-            pattern = re.compile(pattern_str)
-            
-            matching_files = []
-            for filename in os.listdir(self.data_dir):
-                if pattern.match(filename):
-                    matching_files.append(filename)
+            # Keep a running max by name, which includes the version date
+            latest_entry = None
+            with os.scandir(self.data_dir) as entries:
+                for entry in entries:
+                    # Skip in-progress downloads, which may run alongside a backup
+                    if (self.file_pattern_re.match(entry.name)
+                            and not entry.name.endswith((_PARTIAL_SUFFIX, _VALIDATOR_SUFFIX))
+                            and (latest_entry is None or entry.name > latest_entry.name)
+                            and entry.is_file()):
+                        latest_entry = entry
                     
-            if not matching_files:
+            if latest_entry is None:
                 return None
                 
-            # Sort by name to get the latest version
-            latest_file = sorted(matching_files)[-1]
-            return os.path.join(self.data_dir, latest_file)
+            return latest_entry.path
             
         except Exception as e:
             self.logger.error(">>>> ZimDownloadManager::get_latest_local_file Error finding local file: %s", str(e))
@@ -130,66 +217,61 @@ class ZimDownloadManager(IDownloadManager):
         if not latest_version:
             return True
             
-        # Extract version dates
-        remote_date = self._extract_version_date(remote_file)
+        # Extract versions as (year, month), which compare chronologically
+        remote_version = self._extract_version_tuple(remote_file)
         
-        if not remote_date:
+        if not remote_version:
             self.logger.error(">>>> ZimDownloadManager::is_newer_version Could not extract date from remote file")
             # If we can't determine, assume it's not newer to be safe
             return False
             
-        # Convert metadata version to datetime for comparison
-        match = re.match(r'(\d{4})-(\d{2})', latest_version)
+        match = _METADATA_VERSION_RE.match(latest_version)
         
         if not match:
             self.logger.error(">>>> ZimDownloadManager::is_newer_version Invalid format in metadata version: %s", latest_version)
             return True  # Assume newer if metadata format is invalid
             
-        try:
-            year = int(match.group(1))
-            month = int(match.group(2))
-            local_date = datetime(year, month, 1)
-            
-            # Compare dates
-            return remote_date > local_date
-        except (ValueError, IndexError):
+        local_version = (int(match.group(1)), int(match.group(2)))
+        if not 1 <= local_version[1] <= 12:
             self.logger.error(">>>> ZimDownloadManager::is_newer_version Error comparing version dates")
             return True  # Be conservative and assume it's newer
             
-    def _extract_version_date(self, filename: str) -> Optional[datetime]:
+        return remote_version > local_version
+            
+    def _extract_version_tuple(self, filename: str) -> Optional[Tuple[int, int]]:
         """
-        Extract version date from filename.
+        Extract version year and month from filename.
         
         Args:
             filename: Filename to extract version from
             
         Returns:
-            datetime object if version was successfully extracted, None otherwise
+            Tuple of (year, month) if version was successfully extracted, None otherwise
         """
-        match = re.search(r'_(\d{4})-(\d{2})\.', filename)
+        match = _VERSION_RE.search(filename)
         if not match:
             return None
             
-        try:
-            year = int(match.group(1))
-            month = int(match.group(2))
-            return datetime(year, month, 1)
-        except (ValueError, IndexError):
+        month = int(match.group(2))
+        if not 1 <= month <= 12:
             return None
+        return int(match.group(1)), month
             
-    def download_file(self, url: str) -> bool:
+    def download_file(self, url: str, verify: Optional[Callable[[str], bool]] = None) -> bool:
         """
         Download a file from the specified URL.
         
         Args:
             url: URL to download from
+            verify: Called with the path of the complete temporary file before it is moved into place
+                    and recorded, a file it rejects is discarded
             
         Returns:
             True if download was successful, False otherwise
         """
         target_filename = os.path.basename(url)
         local_file_path = os.path.join(self.data_dir, target_filename)
-        temp_file_path = f"{local_file_path}.downloading"
+        temp_file_path = f"{local_file_path}{_PARTIAL_SUFFIX}"
         
         self.logger.info(">> ZimDownloadManager::download_file Starting download from %s", url)
         self.logger.info(">> ZimDownloadManager::download_file Using temporary file path: %s", temp_file_path)
@@ -199,87 +281,87 @@ class ZimDownloadManager(IDownloadManager):
         start_time = time.time()
         
         try:
-            # Stream the download to handle large files
-            with requests.get(url, stream=True, timeout=3600) as response:
-                response.raise_for_status()
-                file_size = int(response.headers.get('Content-Length', 0))
-                
-                with open(temp_file_path, 'wb') as f:
-                    downloaded = 0
-                    chunk_size = 1024 * 1024  # 1 MB chunks
-                    
-                    for chunk in response.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            # Log progress every 100MB
-                            if downloaded % (100 * chunk_size) == 0:
-                                # Calculate elapsed time
-                                elapsed_time = time.time() - start_time
-                                
-                                # Calculate download rate (bytes per second)
-                                download_rate = downloaded / elapsed_time if elapsed_time > 0 else 0
-                                
-                                # Calculate ETA (estimated time of arrival) in seconds
-                                remaining_bytes = file_size - downloaded
-                                eta_seconds = remaining_bytes / download_rate if download_rate > 0 else 0
-                                
-                                # Format elapsed time and ETA for display (HH:MM:SS)
-                                elapsed_str = self._format_time_hms(elapsed_time)
-                                eta_str = self._format_time_hms(eta_seconds)
-                                
-                                percent = (downloaded / file_size) * 100 if file_size else 0
-                                
-                                self.logger.info(
-                                    ">> ZimDownloadManager::download_file Downloaded %.2f%% (%d MB / %d MB) | Elapsed: %s | ETA: %s | Speed: %.2f MB/s",
-                                    percent, 
-                                    downloaded / (1024 * 1024), 
-                                    file_size / (1024 * 1024),
-                                    elapsed_str,
-                                    eta_str,
-                                    download_rate / (1024 * 1024)
-                                )
-            
-            # Move the temp file to the final location
-            if os.path.exists(temp_file_path):
-                os.rename(temp_file_path, local_file_path)
-                self.logger.info(">> ZimDownloadManager::download_file Renamed temporary file to final path: %s", local_file_path)
-                
-                # Update metrics
-                download_time = time.time() - start_time
-                file_size = os.path.getsize(local_file_path)
-                
-                if self.download_count_metric:
-                    self.download_count_metric.inc()
-                if self.download_size_metric:
-                    self.download_size_metric.set(file_size)
-                if self.download_time_metric:
-                    self.download_time_metric.set(download_time)
-                
-                # Update metadata after successful download
-                self.metadata_manager.update_download_metadata(target_filename, file_size)
-                
-                # Format total download time for display
-                formatted_time = self._format_time_hms(download_time)
-                
-                self.logger.info(
-                    ">> ZimDownloadManager::download_file Download completed: %d MB in %s (%.2f MB/s)",
-                    file_size / (1024 * 1024),
-                    formatted_time,
-                    (file_size / (1024 * 1024)) / download_time if download_time > 0 else 0
-                )
-                return True
+            # Probe the server once to decide between a parallel ranged download and a single stream.
+            # Later requests go to the URL the probe was redirected to, so they all reach the same mirror
+            download_url, file_size, accepts_ranges, etag, last_modified = self._probe_remote_file(url)
+            
+            # A partial download is resumed only against the validator of the file it was started from,
+            # If-Range then makes the server send the whole file if that file has changed since
+            resume_from = self._resumable_size(temp_file_path, file_size)
+            validator = self._read_validator(temp_file_path) if resume_from else None
+            if resume_from and validator is None:
+                self.logger.warning(">>> ZimDownloadManager::download_file No validator saved for the partial download, starting over")
+                resume_from = 0
+            if not resume_from:
+                validator = etag or last_modified
+                self._save_validator(temp_file_path, validator)
+            
+            if accepts_ranges and file_size - resume_from >= _RANGE_SEGMENTS * _DOWNLOAD_CHUNK:
+                self.logger.info(">> ZimDownloadManager::download_file Downloading %d bytes in %d parallel ranges", file_size - resume_from, _RANGE_SEGMENTS)
+                try:
+                    self._download_ranges(download_url, temp_file_path, file_size, resume_from, validator, start_time)
+                except _RangeNotHonored as e:
+                    # Continue from what the ranges already wrote over a single connection
+                    self.logger.warning(">>> ZimDownloadManager::download_file %s, falling back to a single stream", str(e))
+                    resume_from = self._resumable_size(temp_file_path, file_size)
+                    etag, last_modified = self._download_stream(download_url, temp_file_path, resume_from, 
+                                                                validator, start_time)
             else:
+                etag, last_modified = self._download_stream(download_url, temp_file_path, resume_from, 
+                                                            validator, start_time)
+            
+            # A complete but invalid file cannot be repaired by resuming it, so it is not kept
+            if verify is not None and not verify(temp_file_path):
+                self._discard_partial(temp_file_path)
+                raise Exception("Downloaded file failed verification, discarded it")
+            
+            # Move the temp file to the final location, atomically replacing any existing file
+            try:
+                os.replace(temp_file_path, local_file_path)
+            except FileNotFoundError:
                 raise Exception("Temporary file not found after download")
+            self._save_validator(temp_file_path, None)
+            self.logger.info(">> ZimDownloadManager::download_file Renamed temporary file to final path: %s", local_file_path)
+            
+            # Update metrics
+            download_time = time.time() - start_time
+            file_size = os.path.getsize(local_file_path)
+            
+            if self.download_count_metric:
+                self.download_count_metric.inc()
+            if self.download_size_metric:
+                self.download_size_metric.set(file_size)
+            if self.download_time_metric:
+                self.download_time_metric.set(download_time)
+            
+            # Update metadata after successful download
+            self.metadata_manager.update_download_metadata(target_filename, file_size, etag, last_modified)
+            
+            # Format total download time for display
+            formatted_time = self._format_time_hms(download_time)
+            
+            self.logger.info(
+                ">> ZimDownloadManager::download_file Download completed: %d MB in %s (%.2f MB/s)",
+                file_size / (1024 * 1024),
+                formatted_time,
+                (file_size / (1024 * 1024)) / download_time if download_time > 0 else 0
+            )
+            return True
                 
         except Exception as e:
             self.logger.error(">>>> ZimDownloadManager::download_file Download failed: %s", str(e))
             
-            # Clean up temp file if it exists
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                self.logger.info(">> ZimDownloadManager::download_file Cleaned up temporary file: %s", temp_file_path)
+            # Keep a partial download so the next attempt can resume it, an empty one is cleaned up
+            try:
+                partial_size = os.path.getsize(temp_file_path)
+                if partial_size > 0:
+                    self.logger.info(">> ZimDownloadManager::download_file Keeping partial download for resume: %s (%d bytes)", temp_file_path, partial_size)
+                else:
+                    os.remove(temp_file_path)
+                    self._save_validator(temp_file_path, None)
+                    self.logger.info(">> ZimDownloadManager::download_file Cleaned up temporary file: %s", temp_file_path)
+            except FileNotFoundError:
+                self._save_validator(temp_file_path, None)
             
             # Update failure metric
             if self.download_failures_metric:
@@ -287,6 +369,340 @@ class ZimDownloadManager(IDownloadManager):
                 
             return False
             
+    def _probe_remote_file(self, url: str) -> Tuple[str, int, bool, Optional[str], Optional[str]]:
+        """
+        Issue a HEAD request to learn the size of a remote file and whether it can be fetched in ranges.
+        
+        Args:
+            url: URL of the remote file
+            
+        Returns:
+            Tuple of (final_url, file_size, accepts_ranges, etag, last_modified), with a size of 0 if unknown.
+            final_url is the URL after redirects, or the given URL if the probe failed
+        """
+        try:
+            with self._session.head(url, allow_redirects=True, timeout=30) as response:
+                response.raise_for_status()
+                headers = response.headers
+                file_size = int(headers.get('Content-Length', 0))
+                accepts_ranges = headers.get('Accept-Ranges', '').lower() == 'bytes'
+                return response.url or url, file_size, accepts_ranges, headers.get('ETag'), headers.get('Last-Modified')
+        except Exception as e:
+            # Some servers reject HEAD, the single stream download does not need it
+            self.logger.warning(">>> ZimDownloadManager::_probe_remote_file HEAD request failed, using a single stream: %s", str(e))
+            return url, 0, False, None, None
+            
+    def _resumable_size(self, temp_file_path: str, file_size: int) -> int:
+        """
+        Get the number of bytes of a previous partial download that can be resumed.
+        
+        Args:
+            temp_file_path: Path of the temporary download file
+            file_size: Size of the remote file in bytes, 0 if unknown
+            
+        Returns:
+            Offset to resume the download from, 0 to start over
+        """
+        try:
+            existing = os.path.getsize(temp_file_path)
+        except FileNotFoundError:
+            return 0
+            
+        # A partial file as large as the remote one cannot be trusted, preallocated files look complete
+        if existing == 0 or (file_size and existing >= file_size):
+            return 0
+            
+        self.logger.info(">> ZimDownloadManager::_resumable_size Resuming partial download at byte %d", existing)
+        return existing
+        
+    def _read_validator(self, temp_file_path: str) -> Optional[str]:
+        """
+        Read the validator saved when a partial download was started.
+        
+        Args:
+            temp_file_path: Path of the temporary download file
+            
+        Returns:
+            ETag or Last-Modified of the remote file the partial download came from, None if unknown
+        """
+        try:
+            with open(f"{temp_file_path}{_VALIDATOR_SUFFIX}", 'r') as f:
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(">>> ZimDownloadManager::_read_validator Error reading saved validator: %s", str(e))
+            return None
+            
+    def _save_validator(self, temp_file_path: str, validator: Optional[str]) -> None:
+        """
+        Save the validator of the remote file a partial download is written from, next to that download.
+        
+        Args:
+            temp_file_path: Path of the temporary download file
+            validator: ETag or Last-Modified of the remote file, None to remove the saved one
+        """
+        validator_path = f"{temp_file_path}{_VALIDATOR_SUFFIX}"
+        if validator is None:
+            try:
+                os.remove(validator_path)
+            except FileNotFoundError:
+                pass
+            return
+        with open(validator_path, 'w') as f:
+            f.write(validator)
+        
+    def _discard_partial(self, temp_file_path: str) -> None:
+        """
+        Remove a partial download together with its saved validator.
+        
+        Args:
+            temp_file_path: Path of the temporary download file
+        """
+        try:
+            os.remove(temp_file_path)
+        except FileNotFoundError:
+            pass
+        self._save_validator(temp_file_path, None)
+        
+    def _download_stream(self, url: str, temp_file_path: str, resume_from: int, 
+                         validator: Optional[str], start_time: float) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Download a file over a single connection into the temporary file.
+        
+        Args:
+            url: URL to download from
+            temp_file_path: Path of the temporary file to write
+            resume_from: Bytes already in the temporary file, 0 to start over
+            validator: ETag or Last-Modified saved with the partial download, sent as If-Range when resuming
+            start_time: Time the download started, for progress reporting
+            
+        Returns:
+            Tuple of (etag, last_modified) from the response headers
+        """
+        # Without a validator a changed remote file could be stitched onto the old bytes
+        if resume_from and not validator:
+            self.logger.warning(">>> ZimDownloadManager::_download_stream Cannot validate the partial download, starting over")
+            resume_from = 0
+        
+        # If-Range makes the server send the whole file instead of the range when it changed
+        headers = {'Range': f'bytes={resume_from}-', 'If-Range': validator} if resume_from else None
+        
+        with self._session.get(url, headers=headers, stream=True, timeout=3600) as response:
+            if resume_from and response.status_code == 416:
+                # The partial file does not fit the remote one anymore
+                self._discard_partial(temp_file_path)
+                raise Exception("Partial download does not match the remote file, discarded it")
+                
+            response.raise_for_status()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            
+            # The server sends the whole file again if it ignores the range or the file has changed
+            if resume_from and response.status_code != 206:
+                self.logger.warning(">>> ZimDownloadManager::_download_stream Partial download cannot be resumed, starting over")
+                resume_from = 0
+            if not resume_from:
+                # What gets written now belongs to the file this response describes
+                self._save_validator(temp_file_path, etag or last_modified)
+            file_size = resume_from + int(response.headers.get('Content-Length', 0))
+            
+            # Reserve the whole file up front, writing resumes right after the bytes already present
+            fd = os.open(temp_file_path, os.O_WRONLY | os.O_CREAT | (0 if resume_from else os.O_TRUNC), 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                try:
+                    if file_size > resume_from:
+                        self._preallocate(fd, file_size)
+                    f.seek(resume_from)
+                    
+                    # Without progress logging there is nothing to do per chunk, let the copy run in C
+                    if not self.logger.isEnabledFor(logging.INFO):
+                        response.raw.decode_content = True
+                        shutil.copyfileobj(response.raw, f, _DOWNLOAD_CHUNK)
+                        return etag, last_modified
+                        
+                    # Log progress every 100MB
+                    next_log_at = resume_from + _PROGRESS_INTERVAL
+                    log_progress = self._log_progress
+                    
+                    # Read the raw stream directly, iter_content fixes the chunk size when called
+                    response.raw.decode_content = True
+                    read = response.raw.read
+                    write = f.write
+                    chunk_size = _INITIAL_STREAM_CHUNK
+                    downloaded = resume_from
+                    next_tune_at = downloaded + _TUNE_INTERVAL
+                    tune_started = time.time()
+                    tune_downloaded = downloaded
+                    
+                    while True:
+                        chunk = read(chunk_size)
+                        if not chunk:
+                            break
+                        write(chunk)
+                        downloaded += len(chunk)
+                        
+                        if downloaded >= next_log_at:
+                            next_log_at += _PROGRESS_INTERVAL
+                            log_progress(downloaded, file_size, start_time, resume_from)
+                            
+                        # Larger reads cut per-chunk overhead on fast links, smaller ones keep slow links responsive
+                        if downloaded >= next_tune_at:
+                            now = time.time()
+                            elapsed = now - tune_started
+                            rate = (downloaded - tune_downloaded) / elapsed if elapsed > 0 else _FAST_RATE + 1
+                            if rate > _FAST_RATE and chunk_size < _MAX_STREAM_CHUNK:
+                                chunk_size <<= 1
+                            elif rate < _SLOW_RATE and chunk_size > _MIN_STREAM_CHUNK:
+                                chunk_size >>= 1
+                            next_tune_at = downloaded + _TUNE_INTERVAL
+                            tune_started = now
+                            tune_downloaded = downloaded
+                finally:
+                    # Drop reserved space past what was written, a later resume goes by the file size
+                    f.truncate()
+                    
+        return etag, last_modified
+        
+    def _download_ranges(self, url: str, temp_file_path: str, file_size: int, resume_from: int, 
+                         validator: Optional[str], start_time: float) -> None:
+        """
+        Download a file as concurrent byte ranges written in place into a preallocated temporary file.
+        On failure the file is truncated to the contiguous prefix written, so it can be resumed.
+        
+        Args:
+            url: URL to download from
+            temp_file_path: Path of the temporary file to write
+            file_size: Total size of the remote file in bytes
+            resume_from: Bytes already in the temporary file, 0 to start over
+            validator: ETag or Last-Modified saved with the partial download, so a changed file is never stitched together
+            start_time: Time the download started, for progress reporting
+            
+        Raises:
+            _RangeNotHonored: If the server answered a range request with anything but 206
+        """
+        segment_size = -(-(file_size - resume_from) // _RANGE_SEGMENTS)
+        segments = [(offset, min(offset + segment_size, file_size)) 
+                    for offset in range(resume_from, file_size, segment_size)]
+        # Offset each worker has written up to
+        reached = [start for start, _ in segments]
+        
+        # Shared progress across the workers
+        log_progress = self.logger.isEnabledFor(logging.INFO)
+        progress_lock = threading.Lock()
+        progress = {'downloaded': resume_from, 'next_log_at': resume_from + _PROGRESS_INTERVAL}
+        abort = threading.Event()
+        
+        fd = os.open(temp_file_path, os.O_WRONLY | os.O_CREAT | (0 if resume_from else os.O_TRUNC), 0o644)
+        try:
+            self._preallocate(fd, file_size)
+            
+            def fetch_segment(index: int) -> None:
+                start, end = segments[index]
+                headers = {'Range': f'bytes={start}-{end - 1}'}
+                if validator:
+                    # Ask for the whole file instead of a range if it changed since the partial download started
+                    headers['If-Range'] = validator
+                    
+                with self._session.get(url, headers=headers, stream=True, timeout=3600) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise _RangeNotHonored(
+                            f"Server answered range request for bytes {start}-{end - 1} with status {response.status_code}"
+                        )
+                        
+                    offset = start
+                    for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK):
+                        if abort.is_set():
+                            return
+                        view = memoryview(chunk)
+                        while view:
+                            written = os.pwrite(fd, view, offset)
+                            offset += written
+                            view = view[written:]
+                        reached[index] = offset
+                            
+                        if log_progress:
+                            with progress_lock:
+                                progress['downloaded'] += len(chunk)
+                                if progress['downloaded'] >= progress['next_log_at']:
+                                    progress['next_log_at'] += _PROGRESS_INTERVAL
+                                    self._log_progress(progress['downloaded'], file_size, start_time, resume_from)
+                                    
+                if offset != end:
+                    raise Exception(f"Range {start}-{end - 1} ended early at byte {offset}")
+                    
+            try:
+                with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+                    futures = [executor.submit(fetch_segment, index) for index in range(len(segments))]
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    except Exception:
+                        # Stop the remaining workers at their next chunk
+                        abort.set()
+                        raise
+            except Exception:
+                # Keep only the contiguous prefix that was written, so a resume never trusts a gap
+                written_to = resume_from
+                for (_, end), offset in zip(segments, reached):
+                    written_to = offset
+                    if offset < end:
+                        break
+                os.ftruncate(fd, written_to)
+                raise
+        finally:
+            os.close(fd)
+            
+    def _preallocate(self, fd: int, size: int) -> None:
+        """
+        Reserve disk space for a file up front so that concurrent writes do not fragment it.
+        
+        Args:
+            fd: File descriptor of the file to preallocate
+            size: Size to reserve in bytes
+        """
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError) as e:
+            # Not every platform or filesystem supports it, a sparse file works as well
+            self.logger.debug("> ZimDownloadManager::_preallocate posix_fallocate unavailable, extending the file instead: %s", str(e))
+            os.ftruncate(fd, size)
+            
+    def _log_progress(self, downloaded: int, file_size: int, start_time: float, resumed_from: int = 0) -> None:
+        """
+        Log download progress with elapsed time, ETA and speed.
+        
+        Args:
+            downloaded: Bytes downloaded so far
+            file_size: Total size of the file in bytes, 0 if unknown
+            start_time: Time the download started
+            resumed_from: Bytes that were already present when the download started
+        """
+        # Calculate elapsed time
+        elapsed_time = time.time() - start_time
+        
+        # Calculate download rate (bytes per second) over this session only
+        download_rate = (downloaded - resumed_from) / elapsed_time if elapsed_time > 0 else 0
+        
+        # Calculate ETA (estimated time of arrival) in seconds
+        remaining_bytes = file_size - downloaded
+        eta_seconds = remaining_bytes / download_rate if download_rate > 0 else 0
+        
+        # Format elapsed time and ETA for display (HH:MM:SS)
+        elapsed_str = self._format_time_hms(elapsed_time)
+        eta_str = self._format_time_hms(eta_seconds)
+        
+        self.logger.info(
+            ">> ZimDownloadManager::_log_progress Downloaded %.2f%% (%d MB / %d MB) | Elapsed: %s | ETA: %s | Speed: %.2f MB/s",
+            downloaded * 100.0 / file_size if file_size else 0.0, 
+            downloaded >> 20, 
+            file_size >> 20,
+            elapsed_str,
+            eta_str,
+            download_rate / (1024 * 1024)
+        )
+        
     def _format_time_hms(self, seconds: float) -> str:
         """
         Format time in seconds to a human-readable HH:MM:SS format.
@@ -2,16 +2,34 @@
 """
 ZIM file implementation of the metadata manager.
 Handles metadata for any ZIM file downloads.
+
+Metadata lives in two files: a JSON snapshot (array of source objects) and an
+append-only JSONL journal of the changes made since that snapshot was written.
+Recording a download appends a single line instead of rewriting the snapshot.
 """
 import os
+import copy
 import json
 import logging
 import re
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 from src.sources.interfaces.metadata_manager import IMetadataManager
 
+# Version embedded in ZIM filenames, e.g. wikipedia_en_all_maxi_2024-01.zim
+_VERSION_RE = re.compile(r'_(\d{4}-\d{2})\.')
+
+# Journal entry operations
+_OP_DOWNLOAD = "download"
+_OP_CHECKSUM = "checksum"
+
+# The journal is folded into the snapshot once it outgrows the snapshot this many times
+_COMPACT_RATIO = 10
+# Snapshot size assumed for the ratio when it is smaller, so tiny files are not compacted on every append
+_COMPACT_MIN_SNAPSHOT_BYTES = 4096
+
 class ZimMetadataManager(IMetadataManager):
     """Manages metadata for ZIM file downloads (multi-source, array-based)."""
     
@@ -27,32 +45,77 @@ class ZimMetadataManager(IMetadataManager):
         self.logger = logging.getLogger(__name__)
         self.data_dir = data_dir
         self.metadata_file = os.path.join(self.data_dir, metadata_filename)
+        self.journal_file = f"{os.path.splitext(self.metadata_file)[0]}.jsonl"
         self.source_name = source_name or os.path.basename(data_dir)
+        # Tiny pointer holding this source's latest version and the metadata file state it was read from
+        self.latest_version_file = os.path.join(self.data_dir, f"{self.source_name}_latest_version.txt")
+        # Serializes load-modify-save cycles, checksums are recorded from a background thread
+        self._update_lock = threading.Lock()
+        # Parsed metadata and the (mtime_ns, size) of the snapshot and journal it was built from
+        self._cached_metadata: Optional[List[Dict[str, Any]]] = None
+        # The cached metadata objects keyed by source name, shared with the list above
+        self._cached_by_source: Dict[str, Dict[str, Any]] = {}
+        self._cached_stat_key: Optional[Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]] = None
 
     def load_metadata(self) -> List[Dict[str, Any]]:
         """
-        Load download metadata from JSON file (array of source objects).
+        Load download metadata from the JSON snapshot and replay the journal on top of it.
         
         Returns:
             List of metadata objects (one per source)
         """
-        if not os.path.exists(self.metadata_file):
-            self.logger.debug("> ZimMetadataManager::load_metadata Metadata file not found, creating empty array")
-            return []
+        # Callers may modify the result, so they get their own copy of the cache
+        return copy.deepcopy(self._load_cached()[0])
+
+    def _load_cached(self) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Load download metadata for read-only internal use, sharing the cached objects.
+        
+        Returns:
+            Tuple of (list of metadata objects, the same objects keyed by source name), must not be modified
+        """
         try:
-            with open(self.metadata_file, 'r') as f:
-                metadata = json.load(f)
-                if not isinstance(metadata, list):
-                    self.logger.warning(">>> ZimMetadataManager::load_metadata Metadata not array, converting")
-                    metadata = [metadata]
-                return metadata
+            # Skip the parse entirely while both files are unchanged since the last read or write
+            stat_key = self._current_stat_key()
+            if self._cached_metadata is not None and stat_key == self._cached_stat_key:
+                return self._cached_metadata, self._cached_by_source
+            
+            snapshot_key, journal_key = stat_key
+            if snapshot_key is None and journal_key is None:
+                self.logger.debug("> ZimMetadataManager::_load_cached Metadata file not found, creating empty array")
+                return [], {}
+            
+            # Files may vanish after the stat (journal dropped by a save), treat that as absent
+            metadata = []
+            if snapshot_key is not None:
+                try:
+                    # One binary read, json decodes the UTF-8 itself without the text I/O layer
+                    with open(self.metadata_file, 'rb') as f:
+                        metadata = json.loads(f.read())
+                        if not isinstance(metadata, list):
+                            self.logger.warning(">>> ZimMetadataManager::_load_cached Metadata not array, converting")
+                            metadata = [metadata]
+                except FileNotFoundError:
+                    pass
+            by_source = self._index_by_source(metadata)
+            if journal_key is not None:
+                try:
+                    self._replay_journal(metadata, by_source)
+                except FileNotFoundError:
+                    pass
+            
+            self._cached_metadata = metadata
+            self._cached_by_source = by_source
+            self._cached_stat_key = stat_key
+            return metadata, by_source
         except Exception as e:
-            self.logger.error(">>>> ZimMetadataManager::load_metadata Error loading metadata: %s", str(e))
-            return []
+            self.logger.error(">>>> ZimMetadataManager::_load_cached Error loading metadata: %s", str(e))
+            return [], {}
 
     def save_metadata(self, metadata: List[Dict[str, Any]]) -> bool:
         """
         Save download metadata to JSON file (array of source objects).
+        The snapshot then holds everything, so the journal is discarded.
         
         Args:
             metadata: List of metadata objects
@@ -60,59 +123,109 @@ class ZimMetadataManager(IMetadataManager):
         Returns:
             True if save was successful, False otherwise
         """
+        # Write to a temporary file and swap it in, so a crash never leaves a truncated file
+        tmp_file = f"{self.metadata_file}.tmp"
         try:
-            with open(self.metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=4)
-                self.logger.debug("> ZimMetadataManager::save_metadata Metadata saved successfully")
-                return True
+            buf = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                # A single write normally covers the whole payload, loop only on short writes
+                view = memoryview(buf)
+                while view:
+                    view = view[os.write(fd, view):]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp_file, self.metadata_file)
+            
+            # Replaying a leftover journal after a crash here is harmless, entries are idempotent
+            try:
+                os.remove(self.journal_file)
+            except FileNotFoundError:
+                pass
+            
+            self._cached_metadata = copy.deepcopy(metadata)
+            self._cached_by_source = self._index_by_source(self._cached_metadata)
+            self._cached_stat_key = self._current_stat_key()
+            
+            source_meta = self._cached_by_source.get(self.source_name)
+            self._write_latest_version(source_meta.get("latest_version") if source_meta else None, self._cached_stat_key)
+            self.logger.debug("> ZimMetadataManager::save_metadata Metadata saved successfully")
+            return True
         except Exception as e:
             self.logger.error(">>>> ZimMetadataManager::save_metadata Error saving metadata: %s", str(e))
             return False
 
-    def update_download_metadata(self, filename: str, file_size: int) -> bool:
+    def update_download_metadata(self, filename: str, file_size: int,
+                                 etag: Optional[str] = None,
+                                 last_modified: Optional[str] = None) -> bool:
         """
         Update download metadata for this source (in array of sources).
         
         Args:
             filename: Name of the downloaded file
             file_size: Size of the downloaded file in bytes
+            etag: ETag header returned by the server, if any
+            last_modified: Last-Modified header returned by the server, if any
             
         Returns:
             True if update was successful, False otherwise
         """
-        match = re.search(r'_(\d{4}-\d{2})\.', filename)
+        match = _VERSION_RE.search(filename)
         if not match:
             self.logger.error(">>>> ZimMetadataManager::update_download_metadata Could not extract version from filename")
             return False
         version = match.group(1)
-        current_date = datetime.now().isoformat()
-        all_metadata = self.load_metadata()
-        # Find or create this source's metadata object
-        source_meta = None
-        for meta in all_metadata:
-            if meta.get("source_name") == self.source_name:
-                source_meta = meta
-                break
-        if not source_meta:
-            source_meta = {
-                "source_name": self.source_name,
-                "downloads": [],
-                "latest_version": None,
-                "latest_download_date": None
-            }
-            all_metadata.append(source_meta)
+        # Single clock read so the date and the timestamp describe the same instant
+        now = datetime.now()
         # Create download record
         download_record = {
             "filename": filename,
             "version": version,
             "size_bytes": file_size,
-            "download_date": current_date,
-            "download_timestamp": datetime.now().timestamp()
+            "download_date": now.isoformat(),
+            "download_timestamp": now.timestamp(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": None
         }
-        source_meta["downloads"].append(download_record)
-        source_meta["latest_version"] = version
-        source_meta["latest_download_date"] = current_date
-        return self.save_metadata(all_metadata)
+        with self._update_lock:
+            if not self._append_journal({
+                "op": _OP_DOWNLOAD,
+                "source_name": self.source_name,
+                "record": download_record
+            }):
+                return False
+            self._write_latest_version(version, self._current_stat_key())
+            return True
+
+    def update_download_checksum(self, filename: str, sha256: str) -> bool:
+        """
+        Record the SHA-256 of the most recent download of a file for this source.
+        
+        Args:
+            filename: Name of the downloaded file
+            sha256: Hex SHA-256 digest of the file
+            
+        Returns:
+            True if update was successful, False otherwise
+        """
+        with self._update_lock:
+            source_meta = self._load_cached()[1].get(self.source_name)
+            downloads = source_meta.get("downloads", []) if source_meta else []
+            if not any(record.get("filename") == filename for record in downloads):
+                self.logger.warning(">>> ZimMetadataManager::update_download_checksum No download record for %s", filename)
+                return False
+            if not self._append_journal({
+                "op": _OP_CHECKSUM,
+                "source_name": self.source_name,
+                "filename": filename,
+                "sha256": sha256
+            }):
+                return False
+            # The version is unchanged, but the pointer must match the grown journal to stay trusted
+            self._write_latest_version(source_meta.get("latest_version"), self._current_stat_key())
+            return True
 
     def get_latest_version(self) -> Optional[str]:
         """
@@ -121,8 +234,202 @@ class ZimMetadataManager(IMetadataManager):
         Returns:
             Latest version string or None if no downloads exist
         """
-        all_metadata = self.load_metadata()
-        for meta in all_metadata:
-            if meta.get("source_name") == self.source_name:
-                return meta.get("latest_version")
-        return None
\ No newline at end of file
+        stat_key = self._current_stat_key()
+        # Without metadata files there are no downloads, whatever a leftover pointer says
+        if stat_key == (None, None):
+            return None
+        
+        # The cache answers from the two stats just taken while the files are unchanged
+        if self._cached_metadata is None or self._cached_stat_key != stat_key:
+            # Otherwise the pointer, trusted only if it was written for exactly the current metadata files
+            try:
+                with open(self.latest_version_file, 'r') as f:
+                    version, _, pointer_key = f.read().partition('\n')
+                if pointer_key == self._format_stat_key(stat_key):
+                    return version or None
+            except FileNotFoundError:
+                pass
+        
+        # The pointer is only rewritten by the write paths, a read never writes
+        source_meta = self._load_cached()[1].get(self.source_name)
+        return source_meta.get("latest_version") if source_meta else None
+
+    def _current_stat_key(self) -> Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]:
+        """
+        Identify the current state of the snapshot and journal files.
+        
+        Returns:
+            Tuple of (mtime_ns, size) per file, None for a missing file
+        """
+        keys = []
+        for path in (self.metadata_file, self.journal_file):
+            try:
+                st = os.stat(path)
+                keys.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                keys.append(None)
+        return keys[0], keys[1]
+
+    def _format_stat_key(self, stat_key: Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]) -> str:
+        """
+        Serialize a metadata stat key for the latest-version pointer file.
+        
+        Args:
+            stat_key: Tuple of (mtime_ns, size) per file, None for a missing file
+            
+        Returns:
+            Space-separated mtime and size of each file, '-' for a missing one
+        """
+        return ' '.join('- -' if key is None else f"{key[0]} {key[1]}" for key in stat_key)
+
+    def _append_journal(self, entry: Dict[str, Any]) -> bool:
+        """
+        Append one entry to the journal with a single write, compacting the journal when it grows too large.
+        
+        Args:
+            entry: Journal entry to append
+            
+        Returns:
+            True if the entry was written, False otherwise
+        """
+        try:
+            cache_fresh = self._cached_metadata is not None and self._cached_stat_key == self._current_stat_key()
+            
+            line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+            fd = os.open(self.journal_file, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                # Start on a fresh line if a crash left a torn entry at the end
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b'\n':
+                    line = b'\n' + line
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            
+            # Keep the cache in step with the file instead of re-reading it on the next load
+            if cache_fresh:
+                self._apply_journal_entry(self._cached_metadata, self._cached_by_source, entry)
+                self._cached_stat_key = self._current_stat_key()
+            else:
+                self._cached_metadata = None
+        except Exception as e:
+            self.logger.error(">>>> ZimMetadataManager::_append_journal Error writing metadata journal: %s", str(e))
+            return False
+        
+        self._compact_journal_if_needed()
+        return True
+
+    def _compact_journal_if_needed(self) -> None:
+        """
+        Rewrite the snapshot and drop the journal once the journal is much larger than the snapshot.
+        Replay cost and disk use then stay proportional to the metadata itself.
+        """
+        snapshot_key, journal_key = self._current_stat_key()
+        if journal_key is None:
+            return
+        snapshot_size = snapshot_key[1] if snapshot_key else 0
+        if journal_key[1] <= _COMPACT_RATIO * max(snapshot_size, _COMPACT_MIN_SNAPSHOT_BYTES):
+            return
+        
+        self.logger.info(">> ZimMetadataManager::_compact_journal_if_needed Compacting %d byte journal into the snapshot", journal_key[1])
+        # A failed save leaves the journal in place, it is simply retried on the next append
+        self.save_metadata(self._load_cached()[0])
+
+    def _write_latest_version(self, version: Optional[str],
+                              stat_key: Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]) -> None:
+        """
+        Atomically replace the latest-version pointer file.
+        
+        Args:
+            version: Latest version of this source, None if there is none
+            stat_key: State of the metadata files the version was read from, see _current_stat_key
+        """
+        tmp_file = f"{self.latest_version_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                f.write(f"{version or ''}\n{self._format_stat_key(stat_key)}")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.latest_version_file)
+        except Exception as e:
+            # Not fatal, get_latest_version falls back to the full metadata
+            self.logger.warning(">>> ZimMetadataManager::_write_latest_version Error writing latest version: %s", str(e))
+    
+    def _replay_journal(self, metadata: List[Dict[str, Any]], by_source: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Apply every journal entry, in order, to the metadata loaded from the snapshot.
+        
+        Args:
+            metadata: List of metadata objects to update in place
+            by_source: Index of the metadata objects by source name, updated in place
+        """
+        # Read in binary like the snapshot, json decodes each UTF-8 line itself
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                if line.isspace():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Only a torn last line from a crash mid-append can fail to parse
+                    self.logger.warning(">>> ZimMetadataManager::_replay_journal Skipping malformed journal line")
+                    continue
+                self._apply_journal_entry(metadata, by_source, entry)
+
+    def _apply_journal_entry(self, metadata: List[Dict[str, Any]], by_source: Dict[str, Dict[str, Any]],
+                             entry: Dict[str, Any]) -> None:
+        """
+        Apply a single journal entry to the metadata. Applying an entry twice has no further effect.
+        
+        Args:
+            metadata: List of metadata objects to update in place
+            by_source: Index of the metadata objects by source name, updated in place
+            entry: Journal entry to apply
+        """
+        source_name = entry.get("source_name")
+        source_meta = by_source.get(source_name)
+        if source_meta is None:
+            source_meta = {
+                "source_name": source_name,
+                "downloads": [],
+                "latest_version": None,
+                "latest_download_date": None
+            }
+            metadata.append(source_meta)
+            by_source[source_name] = source_meta
+        
+        op = entry.get("op")
+        if op == _OP_DOWNLOAD:
+            record = entry["record"]
+            already_recorded = any(
+                existing.get("filename") == record["filename"]
+                and existing.get("download_timestamp") == record["download_timestamp"]
+                for existing in source_meta["downloads"]
+            )
+            if not already_recorded:
+                source_meta["downloads"].append(record)
+            source_meta["latest_version"] = record["version"]
+            source_meta["latest_download_date"] = record["download_date"]
+        elif op == _OP_CHECKSUM:
+            for record in reversed(source_meta["downloads"]):
+                if record.get("filename") == entry["filename"]:
+                    record["sha256"] = entry["sha256"]
+                    break
+        else:
+            self.logger.warning(">>> ZimMetadataManager::_apply_journal_entry Unknown journal operation: %s", op)
+
+    def _index_by_source(self, metadata: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Index metadata objects by source name.
+        
+        Args:
+            metadata: List of metadata objects
+            
+        Returns:
+            Dictionary of source name to the source's metadata object, the first one wins on duplicates
+        """
+        by_source = {}
+        for meta in metadata:
+            by_source.setdefault(meta.get("source_name"), meta)
+        return by_source
@@ -4,16 +4,69 @@ Generic ZIM file verification service implementation.
 Handles verification of ZIM files from any source.
 """
 import os
+import mmap
+import struct
+import hashlib
 import logging
+from concurrent.futures import Executor, Future
+from typing import Optional
 
 from src.sources.interfaces.verification_service import IVerificationService
 
+# ZIM header layout (openzim.org/wiki/ZIM_file_format): magic, major/minor version, uuid,
+# entry and cluster counts, path/title/cluster/mime pointer positions, main and layout pages,
+# checksum position
+_ZIM_HEADER = struct.Struct('<IHH16sIIQQQQIIQ')
+_ZIM_MAGIC = 72173914  # b'ZIM\x04' read as little-endian uint32
+_ZIM_CHECKSUM_SIZE = 16  # MD5 digest stored at checksumPos
+
+# Suffix of downloads verified before they are moved into place under their final name
+_PARTIAL_SUFFIX = '.downloading'
+
+# Slice size fed to the hash per update, keeps each step cache friendly
+_HASH_CHUNK = 64 * 1024 * 1024
+
+
+def _compute_sha256(file_path: str) -> str:
+    """
+    Compute the SHA-256 digest of a file through a read-only memory map.
+    Runs in a worker process, so it must stay a module-level function.
+    
+    Args:
+        file_path: Path to the file to hash
+        
+    Returns:
+        Hex digest of the file
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as view:
+                for offset in range(0, size, _HASH_CHUNK):
+                    digest.update(view[offset:offset + _HASH_CHUNK])
+    return digest.hexdigest()
+
+
 class ZimVerificationService(IVerificationService):
     """Verifies the integrity of ZIM files from any source."""
     
-    def __init__(self):
-        """Initialize the verification service."""
+    def __init__(self, verify_checksum: bool = False, checksum_executor: Optional[Executor] = None):
+        """
+        Initialize the verification service.
+        
+        Args:
+            verify_checksum: Also check the MD5 embedded in the ZIM file, which reads the whole file
+            checksum_executor: Executor running background checksums, owned and shut down by the caller.
+                               Without one, checksums are computed inline
+        """
         self.logger = logging.getLogger(__name__)
+        self.verify_checksum = verify_checksum
+        self.checksum_executor = checksum_executor
     
     def verify_download(self, file_path: str) -> bool:
         """
@@ -25,28 +78,120 @@ class ZimVerificationService(IVerificationService):
         Returns:
             True if verification passed, False otherwise
         """
-        if not os.path.exists(file_path):
-            self.logger.error(">>>> ZimVerificationService::verify_download File does not exist: %s", file_path)
-            return False
-        
         try:
-            # Basic file size check
-            file_size = os.path.getsize(file_path)
+            # Basic file size check, a single stat also tells whether the file exists
+            try:
+                file_size = os.stat(file_path).st_size
+            except FileNotFoundError:
+                self.logger.error(">>>> ZimVerificationService::verify_download File does not exist: %s", file_path)
+                return False
+            
             if file_size == 0:
                 self.logger.error(">>>> ZimVerificationService::verify_download File is empty")
                 return False
             
-            # Check file extension
-            if not file_path.lower().endswith('.zim'):
+            # Check file extension, lowercasing only the suffix instead of the whole path
+            final_path = file_path[:-len(_PARTIAL_SUFFIX)] if file_path.endswith(_PARTIAL_SUFFIX) else file_path
+            if final_path[-4:].lower() != '.zim':
                 self.logger.warning(">>> ZimVerificationService::verify_download File does not have .zim extension: %s", file_path)
                 # Not a fatal error, but worth noting
             
-            # Additional verification could be implemented here
-            # For example, checking ZIM file headers or running consistency checks
+            # Check the ZIM header, this catches non-ZIM and obviously truncated files
+            checksum_pos = self._verify_header(file_path, file_size)
+            if checksum_pos is None:
+                return False
+            
+            # Optionally check the embedded MD5, this catches corruption anywhere in the file
+            if self.verify_checksum and not self._verify_embedded_md5(file_path, checksum_pos):
+                return False
             
             self.logger.info(">> ZimVerificationService::verify_download File verification passed")
             return True
             
         except Exception as e:
             self.logger.error(">>>> ZimVerificationService::verify_download Verification failed: %s", str(e))
-            return False
\ No newline at end of file
+            return False
+    
+    def _verify_header(self, file_path: str, file_size: int) -> Optional[int]:
+        """
+        Validate the fixed-size ZIM header at the start of the file.
+        
+        Args:
+            file_path: Path to the file to verify
+            file_size: Size of the file in bytes
+            
+        Returns:
+            Position of the embedded checksum if the header is consistent with the file, None otherwise
+        """
+        if file_size < _ZIM_HEADER.size + _ZIM_CHECKSUM_SIZE:
+            self.logger.error(">>>> ZimVerificationService::_verify_header File too small for a ZIM header")
+            return None
+        
+        with open(file_path, 'rb') as f:
+            header = _ZIM_HEADER.unpack(f.read(_ZIM_HEADER.size))
+        magic, cluster_count, checksum_pos = header[0], header[5], header[12]
+        
+        if magic != _ZIM_MAGIC:
+            self.logger.error(">>>> ZimVerificationService::_verify_header Invalid ZIM magic number: %#x", magic)
+            return None
+        if cluster_count == 0:
+            self.logger.error(">>>> ZimVerificationService::_verify_header ZIM header reports no clusters")
+            return None
+        if checksum_pos + _ZIM_CHECKSUM_SIZE > file_size:
+            self.logger.error(
+                ">>>> ZimVerificationService::_verify_header Checksum position %d beyond file size %d, file truncated",
+                checksum_pos, file_size
+            )
+            return None
+        return checksum_pos
+    
+    def _verify_embedded_md5(self, file_path: str, checksum_pos: int) -> bool:
+        """
+        Compare the MD5 of everything before the checksum position with the digest stored there.
+        
+        Args:
+            file_path: Path to the file to verify
+            checksum_pos: Position of the embedded MD5 digest, as validated from the header
+            
+        Returns:
+            True if the digests match, False otherwise
+        """
+        self.logger.info(">> ZimVerificationService::_verify_embedded_md5 Checking embedded MD5 of %s", file_path)
+        digest = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mm) as view:
+                    for offset in range(0, checksum_pos, _HASH_CHUNK):
+                        digest.update(view[offset:min(offset + _HASH_CHUNK, checksum_pos)])
+                    stored = bytes(view[checksum_pos:checksum_pos + _ZIM_CHECKSUM_SIZE])
+        
+        if digest.digest() != stored:
+            self.logger.error(">>>> ZimVerificationService::_verify_embedded_md5 Embedded MD5 mismatch, file corrupted")
+            return False
+        return True
+    
+    def start_checksum(self, file_path: str) -> Future:
+        """
+        Start computing the SHA-256 of a file on the checksum executor.
+        The file is memory-mapped by the worker, so no data is copied over IPC.
+        
+        Args:
+            file_path: Path to the file to checksum
+            
+        Returns:
+            Future resolving to the hex digest of the file
+        """
+        if self.checksum_executor is not None:
+            self.logger.info(">> ZimVerificationService::start_checksum Computing SHA-256 in background for %s", file_path)
+            return self.checksum_executor.submit(_compute_sha256, file_path)
+        
+        # Nobody owns a pool to run it on, compute it now rather than leave an unowned one behind
+        self.logger.info(">> ZimVerificationService::start_checksum Computing SHA-256 for %s", file_path)
+        future = Future()
+        try:
+            future.set_result(_compute_sha256(file_path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
@@ -3,17 +3,49 @@
 Factory for creating ZIM connector and its components.
 Handles instantiation and dependency injection for generic ZIM components.
 """
+from __future__ import annotations
+
 import os
+import re
 import logging
-from typing import Dict, Any
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, Optional, Pattern, Set
+
+# Only needed for annotations, the components are imported when a connector is built
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from src.core.config import ConfigManager
+    from src.metrics.prometheus_metrics import MetricsManager
+    from src.sources.zim.connector import ZimConnector
+
+@lru_cache(maxsize=32)
+def _compile_pattern(pattern: str) -> Pattern[str]:
+    """
+    Compile a file pattern once per process, connectors for the same pattern share it.
+    
+    Args:
+        pattern: Regex pattern matching ZIM filenames
+        
+    Returns:
+        Compiled pattern
+    """
+    return re.compile(pattern)
+
+# Directories already known to exist, so repeated factory calls skip the filesystem
+_ensured_dirs: Set[str] = set()
 
-from src.core.config import ConfigManager
-from src.metrics.prometheus_metrics import MetricsManager
-from src.sources.zim.connector import ZimConnector
-from src.sources.zim.implementations.zim_metadata_manager import ZimMetadataManager
-from src.sources.zim.implementations.zim_download_manager import ZimDownloadManager
-from src.sources.zim.implementations.zim_backup_manager import ZimBackupManager
-from src.sources.zim.implementations.zim_verification_service import ZimVerificationService
+def _ensure_dir(path: str) -> None:
+    """
+    Create a directory unless it was already ensured by this process.
+    
+    Args:
+        path: Directory to create
+    """
+    if path in _ensured_dirs:
+        return
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+    _ensured_dirs.add(path)
 
 class ZimFactory:
     """Factory for creating ZIM connector and its components."""
@@ -22,7 +54,8 @@ class ZimFactory:
     def create_connector_from_config(
         config: ConfigManager,
         metrics_manager: MetricsManager,
-        source_config: Dict[str, Any]
+        source_config: Dict[str, Any],
+        checksum_executor: Optional[Executor] = None
     ) -> ZimConnector:
         """
         Create a fully configured ZimConnector from a source configuration.
@@ -31,59 +64,30 @@ class ZimFactory:
             config: Configuration manager
             metrics_manager: Metrics manager
             source_config: Source configuration dictionary
+            checksum_executor: Executor for background checksums, owned and shut down by the caller
             
         Returns:
             Configured ZimConnector instance
         """
         logger = logging.getLogger(__name__)
         
-        # Extract required values from source configuration
         source_name = source_config.get("name", "zim")
-        source_url = source_config.get("source_url", "https://download.kiwix.org/zim/")
-        file_pattern = source_config.get("file_pattern", ".*_[0-9]{4}-[0-9]{2}.zim")
-        data_dir = source_config.get("storage_path", f"data/{source_name}")
-        backup_dir = source_config.get("backup_path", f"backup/{source_name}")
-        max_backups = source_config.get("max_backups", 3)
-        
         logger.debug("> ZimFactory::create_connector_from_config Creating ZIM connector components for %s", source_name)
         
-        # Ensure directories exist
-        os.makedirs(data_dir, exist_ok=True)
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        # Create components
-        metadata_manager = ZimMetadataManager(data_dir, source_name)
-        
-        download_manager = ZimDownloadManager(
-            source_url, 
-            file_pattern, 
-            data_dir, 
-            metadata_manager, 
-            metrics_manager,
-            source_name
-        )
-        
-        backup_manager = ZimBackupManager(
-            data_dir, 
-            backup_dir, 
-            download_manager, 
-            max_backups, 
+        # Extract required values from source configuration and build the components
+        return ZimFactory._build(
+            config,
             metrics_manager,
-            source_name
-        )
-        
-        verification_service = ZimVerificationService()
-        
-        # Create and return the connector
-        logger.info(">> ZimFactory::create_connector_from_config ZIM connector components created successfully for %s", source_name)
-        return ZimConnector(
-            config, 
-            metrics_manager, 
-            metadata_manager, 
-            download_manager, 
-            backup_manager, 
-            verification_service,
-            source_name
+            source_name,
+            source_url=source_config.get("source_url", "https://download.kiwix.org/zim/"),
+            file_pattern=source_config.get("file_pattern", ".*_[0-9]{4}-[0-9]{2}.zim"),
+            data_dir=source_config.get("storage_path", f"data/{source_name}"),
+            backup_dir=source_config.get("backup_path", f"backup/{source_name}"),
+            max_backups=source_config.get("max_backups", 3),
+            parallel_backup_download=source_config.get("parallel_backup_download", True),
+            verify_zim_checksum=source_config.get("verify_zim_checksum", False),
+            record_zim_sha256=source_config.get("record_zim_sha256", False),
+            checksum_executor=checksum_executor
         )
     
     @staticmethod
@@ -91,7 +95,8 @@ class ZimFactory:
         config: ConfigManager,
         metrics_manager: MetricsManager,
         source_name: str = "zim",
-        config_prefix: str = "zim"
+        config_prefix: str = "zim",
+        checksum_executor: Optional[Executor] = None
     ) -> ZimConnector:
         """
         Create a fully configured ZimConnector with all its components.
@@ -101,6 +106,7 @@ class ZimFactory:
             metrics_manager: Metrics manager
             source_name: Name of the source (for metrics and logging)
             config_prefix: Prefix for configuration keys
+            checksum_executor: Executor for background checksums, owned and shut down by the caller
             
         Returns:
             Configured ZimConnector instance
@@ -108,23 +114,76 @@ class ZimFactory:
         logger = logging.getLogger(__name__)
         logger.debug("> ZimFactory::create_connector Creating ZIM connector components for %s", source_name)
         
-        # Get configuration values
-        source_url = config.get(f"{config_prefix}.source_url", "https://download.kiwix.org/zim/")
-        file_pattern = config.get(f"{config_prefix}.file_pattern", ".*_[0-9]{4}-[0-9]{2}.zim")
-        data_dir = config.get(f"{config_prefix}.storage_path", f"data/{source_name}")
-        backup_dir = config.get(f"{config_prefix}.backup_path", f"backup/{source_name}")
-        max_backups = config.get(f"{config_prefix}.max_backups", 3)
+        # Resolve configuration values and build the components
+        return ZimFactory._build(
+            config,
+            metrics_manager,
+            source_name,
+            source_url=config.get(f"{config_prefix}.source_url", "https://download.kiwix.org/zim/"),
+            file_pattern=config.get(f"{config_prefix}.file_pattern", ".*_[0-9]{4}-[0-9]{2}.zim"),
+            data_dir=config.get(f"{config_prefix}.storage_path", f"data/{source_name}"),
+            backup_dir=config.get(f"{config_prefix}.backup_path", f"backup/{source_name}"),
+            max_backups=config.get(f"{config_prefix}.max_backups", 3),
+            parallel_backup_download=config.get(f"{config_prefix}.parallel_backup_download", True),
+            verify_zim_checksum=config.get(f"{config_prefix}.verify_zim_checksum", False),
+            record_zim_sha256=config.get(f"{config_prefix}.record_zim_sha256", False),
+            checksum_executor=checksum_executor
+        )
+    
+    @staticmethod
+    def _build(
+        config: ConfigManager,
+        metrics_manager: MetricsManager,
+        source_name: str,
+        source_url: str,
+        file_pattern: str,
+        data_dir: str,
+        backup_dir: str,
+        max_backups: int,
+        parallel_backup_download: bool,
+        verify_zim_checksum: bool,
+        record_zim_sha256: bool,
+        checksum_executor: Optional[Executor]
+    ) -> ZimConnector:
+        """
+        Create the components of a ZIM source and wire them into a connector.
+        
+        Args:
+            config: Configuration manager
+            metrics_manager: Metrics manager
+            source_name: Name of the source (for metrics and logging)
+            source_url: URL of the directory listing the source's ZIM files
+            file_pattern: Regex pattern matching the source's ZIM filenames
+            data_dir: Directory to store downloaded files
+            backup_dir: Directory to store backups
+            max_backups: Maximum number of backups to keep
+            parallel_backup_download: Whether the backup and the download run concurrently
+            verify_zim_checksum: Whether to check the MD5 embedded in downloaded files
+            record_zim_sha256: Whether to record the SHA-256 of downloaded files in the metadata
+            checksum_executor: Executor for background checksums, None to compute them inline
+            
+        Returns:
+            Configured ZimConnector instance
+        """
+        # Deferred so importing the factory does not load the ZIM stack until it is used
+        from src.sources.zim.connector import ZimConnector
+        from src.sources.zim.implementations.zim_metadata_manager import ZimMetadataManager
+        from src.sources.zim.implementations.zim_download_manager import ZimDownloadManager
+        from src.sources.zim.implementations.zim_backup_manager import ZimBackupManager
+        from src.sources.zim.implementations.zim_verification_service import ZimVerificationService
+        
+        logger = logging.getLogger(__name__)
         
         # Ensure directories exist
-        os.makedirs(data_dir, exist_ok=True)
-        os.makedirs(backup_dir, exist_ok=True)
+        _ensure_dir(data_dir)
+        _ensure_dir(backup_dir)
         
         # Create components
         metadata_manager = ZimMetadataManager(data_dir, source_name)
         
         download_manager = ZimDownloadManager(
             source_url, 
-            file_pattern, 
+            _compile_pattern(file_pattern), 
             data_dir, 
             metadata_manager, 
             metrics_manager,
@@ -140,10 +199,10 @@ class ZimFactory:
             source_name
         )
         
-        verification_service = ZimVerificationService()
+        verification_service = ZimVerificationService(verify_zim_checksum, checksum_executor)
         
         # Create and return the connector
-        logger.info(">> ZimFactory::create_connector ZIM connector components created successfully for %s", source_name)
+        logger.info(">> ZimFactory::_build ZIM connector components created successfully for %s", source_name)
         return ZimConnector(
             config, 
             metrics_manager, 
@@ -151,5 +210,7 @@ class ZimFactory:
             download_manager, 
             backup_manager, 
             verification_service,
-            source_name
+            source_name,
+            parallel_backup_download,
+            record_zim_sha256
         )
\ No newline at end of file
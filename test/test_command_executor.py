@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from src.core import command_executor
+from src.core.command_executor import CommandExecutor
+
+
+class _Config:
+    def __init__(self, sources):
+        self.sources = sources
+
+    def get(self, key, default=None):
+        return self.sources if key == "zim_sources" else default
+
+
+class _Connector:
+    def __init__(self, name, update=True, success=True, checksum_ok=True):
+        self.name = name
+        self.update = update
+        self.success = success
+        self.checksum_ok = checksum_ok
+        self.checks = 0
+        self.updates = []
+        self.checksum_waits = 0
+
+    def check_for_update(self, force=False):
+        self.checks += 1
+        return self.update
+
+    def update_if_needed(self, force=False, already_checked=False):
+        if not already_checked:
+            self.checks += 1
+        self.updates.append(already_checked)
+        return self.success
+
+    def wait_for_checksum(self):
+        self.checksum_waits += 1
+        return self.checksum_ok
+
+
+class _Pools:
+    """Stands in for ProcessPoolExecutor, running the work on threads."""
+
+    def __init__(self):
+        self.created = []
+
+    def __call__(self, max_workers=None, mp_context=None):
+        self.created.append((max_workers, mp_context.get_start_method()))
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    created = {}
+    executors = []
+
+    def create(config, metrics_manager, source_config, checksum_executor=None):
+        executors.append(checksum_executor)
+        return created[source_config["name"]]
+
+    monkeypatch.setattr(command_executor.ZimFactory, "create_connector_from_config", staticmethod(create))
+    pools = _Pools()
+    monkeypatch.setattr(command_executor, "ProcessPoolExecutor", pools)
+    return created, executors, pools
+
+
+def test_each_source_is_checked_once(factory):
+    created, executors, pools = factory
+    created["a"] = _Connector("a")
+    created["b"] = _Connector("b", update=False)
+    executor = CommandExecutor(_Config([{"name": "a"}, {"name": "b"}]), None)
+
+    assert executor.download_sources()
+    assert created["a"].checks == 1
+    assert created["a"].updates == [True]
+    assert created["b"].checks == 1
+    assert created["b"].updates == []
+
+
+def test_checksum_pool_only_with_sources_to_overlap(factory):
+    created, executors, pools = factory
+    created["a"] = _Connector("a")
+    created["b"] = _Connector("b")
+
+    assert CommandExecutor(_Config([{"name": "a"}, {"name": "b"}]), None).download_sources()
+    assert pools.created == []
+    assert executors == [None, None]
+
+    assert CommandExecutor(_Config([{"name": "a", "record_zim_sha256": True}]), None).download_sources()
+    assert pools.created == []
+
+    executors.clear()
+    assert CommandExecutor(_Config([{"name": "a", "record_zim_sha256": True}, {"name": "b"}]), None).download_sources()
+    assert pools.created == [(2, "spawn")]
+    assert executors[0] is not None and executors[0] is executors[1]
+    assert created["a"].checksum_waits == 3
+
+
+def test_failed_checksum_keeps_success(factory):
+    created, executors, pools = factory
+    created["a"] = _Connector("a", checksum_ok=False)
+    created["b"] = _Connector("b")
+    executor = CommandExecutor(_Config([{"name": "a"}, {"name": "b"}]), None)
+
+    assert executor.download_sources()
+    assert executor.download_source("a")
+
+
+def test_failed_download_fails_command(factory):
+    created, executors, pools = factory
+    created["a"] = _Connector("a", success=False)
+    created["b"] = _Connector("b")
+    executor = CommandExecutor(_Config([{"name": "a"}, {"name": "b"}]), None)
+
+    assert not executor.download_sources()
+    assert not executor.download_source("a")
+    assert created["b"].updates == [True]
+
+
+def test_download_source_runs_without_pool(factory):
+    created, executors, pools = factory
+    created["a"] = _Connector("a")
+
+    assert CommandExecutor(_Config([{"name": "a", "record_zim_sha256": True}]), None).download_source("a")
+    assert pools.created == []
+    assert executors == [None]
+    assert created["a"].updates == [False]
+    assert created["a"].checksum_waits == 1
+    assert not CommandExecutor(_Config([{"name": "a"}]), None).download_source("missing")
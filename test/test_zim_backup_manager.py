@@ -0,0 +1,310 @@
+import errno
+import os
+from datetime import datetime
+
+import pytest
+
+from src.sources.zim.implementations import zim_backup_manager
+from src.sources.zim.implementations.zim_backup_manager import ZimBackupManager
+
+
+class _Metrics:
+    def get_metric(self, name):
+        return None
+
+
+class _DownloadManager:
+    def __init__(self, path):
+        self.path = path
+
+    def get_latest_local_file(self):
+        return self.path
+
+
+class _FrozenDatetime:
+    @classmethod
+    def now(cls):
+        return datetime(2024, 1, 2, 3, 4, 5)
+
+
+def _setup(tmp_path, max_backups=5, size=100000):
+    data_dir = tmp_path / "data"
+    backup_dir = tmp_path / "backup"
+    data_dir.mkdir()
+    backup_dir.mkdir()
+    source = data_dir / "wiki_2024-01.zim"
+    data = os.urandom(size)
+    source.write_bytes(data)
+    manager = ZimBackupManager(str(data_dir), str(backup_dir), _DownloadManager(str(source)), max_backups, _Metrics(), "wiki")
+    return manager, source, data
+
+
+def _fail_link(error):
+    def link(src, dst):
+        raise OSError(error, os.strerror(error))
+    return link
+
+
+def test_backups_in_same_second_keep_source_intact(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_backup_manager, "datetime", _FrozenDatetime)
+    manager, source, data = _setup(tmp_path)
+
+    assert manager.backup_current_version()
+    assert manager.backup_current_version()
+    assert manager.backup_current_version()
+
+    assert source.read_bytes() == data
+    backups = sorted(os.listdir(manager.backup_dir))
+    assert backups == [
+        "wiki_2024-01_backup_20240102030405.zim",
+        "wiki_2024-01_backup_20240102030405_1.zim",
+        "wiki_2024-01_backup_20240102030405_2.zim",
+    ]
+    for name in backups:
+        assert (tmp_path / "backup" / name).read_bytes() == data
+
+
+def test_copy_never_opens_existing_backup(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_backup_manager, "datetime", _FrozenDatetime)
+    manager, source, data = _setup(tmp_path)
+    assert manager.backup_current_version()
+
+    # A filesystem that refuses hardlinks sends the second backup to the reflink and copy paths
+    monkeypatch.setattr(zim_backup_manager.os, "link", _fail_link(errno.EXDEV))
+    assert manager.backup_current_version()
+
+    assert source.read_bytes() == data
+    assert sorted(os.listdir(manager.backup_dir)) == [
+        "wiki_2024-01_backup_20240102030405.zim",
+        "wiki_2024-01_backup_20240102030405_1.zim",
+    ]
+    assert (tmp_path / "backup" / "wiki_2024-01_backup_20240102030405_1.zim").read_bytes() == data
+
+
+def test_unexpected_link_error_is_not_retried_as_copy(tmp_path, monkeypatch):
+    manager, source, data = _setup(tmp_path)
+    monkeypatch.setattr(zim_backup_manager.os, "link", _fail_link(errno.EIO))
+
+    assert not manager.backup_current_version()
+    assert source.read_bytes() == data
+    assert os.listdir(manager.backup_dir) == []
+
+
+@pytest.mark.parametrize("error", [errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP])
+def test_link_not_possible_falls_back_to_copy(tmp_path, monkeypatch, error):
+    manager, source, data = _setup(tmp_path)
+    monkeypatch.setattr(zim_backup_manager.os, "link", _fail_link(error))
+
+    assert manager.backup_current_version()
+    backups = os.listdir(manager.backup_dir)
+    assert len(backups) == 1
+    backup = tmp_path / "backup" / backups[0]
+    assert backup.read_bytes() == data
+    assert not os.path.samestat(os.stat(backup), os.stat(source))
+
+
+def _no_link_or_reflink(monkeypatch):
+    monkeypatch.setattr(zim_backup_manager.os, "link", _fail_link(errno.EXDEV))
+
+    def ioctl(fd, request, arg):
+        raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+    monkeypatch.setattr(zim_backup_manager.fcntl, "ioctl", ioctl)
+
+
+def _only_backup(manager):
+    backups = os.listdir(manager.backup_dir)
+    assert len(backups) == 1
+    return os.path.join(manager.backup_dir, backups[0])
+
+
+def test_copy_uses_copy_file_range_and_keeps_metadata(tmp_path, monkeypatch):
+    if not hasattr(os, "copy_file_range"):
+        pytest.skip("copy_file_range not available")
+    _no_link_or_reflink(monkeypatch)
+    manager, source, data = _setup(tmp_path, size=3 * 1024 * 1024 + 17)
+    os.utime(source, (1700000000, 1700000000))
+    calls = []
+    real_copy_file_range = os.copy_file_range
+    monkeypatch.setattr(zim_backup_manager.os, "copy_file_range",
+                        lambda *args: calls.append(args) or real_copy_file_range(*args))
+
+    assert manager.backup_current_version()
+    backup = _only_backup(manager)
+    assert calls
+    with open(backup, 'rb') as f:
+        assert f.read() == data
+    assert os.stat(backup).st_mtime == 1700000000
+
+
+def test_copy_failing_midway_leaves_no_partial_backup(tmp_path, monkeypatch):
+    if not hasattr(os, "copy_file_range"):
+        pytest.skip("copy_file_range not available")
+    _no_link_or_reflink(monkeypatch)
+    manager, source, data = _setup(tmp_path)
+    sent = []
+
+    def copy_file_range(src, dst, count):
+        if sent:
+            raise OSError(errno.EIO, os.strerror(errno.EIO))
+        sent.append(count)
+        return os.write(dst, b'x' * 1000)
+    monkeypatch.setattr(zim_backup_manager.os, "copy_file_range", copy_file_range)
+
+    assert not manager.backup_current_version()
+    assert source.read_bytes() == data
+    assert os.listdir(manager.backup_dir) == []
+
+
+def _no_copy_file_range(monkeypatch):
+    def copy_file_range(src, dst, count):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+    monkeypatch.setattr(zim_backup_manager.os, "copy_file_range", copy_file_range, raising=False)
+
+
+def test_copy_falls_back_to_sendfile(tmp_path, monkeypatch):
+    if not hasattr(os, "sendfile"):
+        pytest.skip("sendfile not available")
+    _no_link_or_reflink(monkeypatch)
+    _no_copy_file_range(monkeypatch)
+    manager, source, data = _setup(tmp_path)
+    calls = []
+    real_sendfile = os.sendfile
+    monkeypatch.setattr(zim_backup_manager.os, "sendfile", lambda *args: calls.append(args) or real_sendfile(*args))
+
+    assert manager.backup_current_version()
+    assert calls
+    with open(_only_backup(manager), 'rb') as f:
+        assert f.read() == data
+
+
+def test_copy_falls_back_to_buffered_copy(tmp_path, monkeypatch):
+    _no_link_or_reflink(monkeypatch)
+    _no_copy_file_range(monkeypatch)
+
+    def sendfile(out_fd, in_fd, offset, count):
+        raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+    monkeypatch.setattr(zim_backup_manager.os, "sendfile", sendfile, raising=False)
+    manager, source, data = _setup(tmp_path)
+
+    assert manager.backup_current_version()
+    with open(_only_backup(manager), 'rb') as f:
+        assert f.read() == data
+
+
+def test_linked_backup_is_not_compared(tmp_path, monkeypatch):
+    manager, source, data = _setup(tmp_path)
+    monkeypatch.setattr(manager, "_contents_match", lambda src, dst: pytest.fail("hardlink compared"))
+
+    assert manager.backup_current_version()
+    assert os.path.samestat(os.stat(_only_backup(manager)), os.stat(source))
+
+
+def test_copied_backup_with_different_contents_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_backup_manager, "_COMPARE_CHUNK", 4096)
+    monkeypatch.setattr(zim_backup_manager.os, "link", _fail_link(errno.EXDEV))
+    manager, source, data = _setup(tmp_path)
+
+    def corrupt_copy(src, dst):
+        with open(dst, 'xb') as f:
+            f.write(data[:50000] + bytes([data[50000] ^ 0xff]) + data[50001:])
+        return 'copy'
+    monkeypatch.setattr(manager, "_link_or_copy", corrupt_copy)
+
+    assert not manager.backup_current_version()
+    assert source.read_bytes() == data
+    assert os.listdir(manager.backup_dir) == []
+
+
+def test_copied_backup_is_compared(tmp_path, monkeypatch):
+    _no_link_or_reflink(monkeypatch)
+    manager, source, data = _setup(tmp_path)
+    compared = []
+    real_contents_match = manager._contents_match
+    monkeypatch.setattr(manager, "_contents_match", lambda src, dst: compared.append(dst) or real_contents_match(src, dst))
+
+    assert manager.backup_current_version()
+    assert compared == [_only_backup(manager)]
+
+
+def _touch_backups(manager, names):
+    for age, name in enumerate(names):
+        path = os.path.join(manager.backup_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'zim')
+        # Modification times run against the timestamps in the names, only the names may decide
+        os.utime(path, (1700000000 + age, 1700000000 + age))
+
+
+def test_cleanup_keeps_newest_backups_by_name(tmp_path):
+    manager, source, data = _setup(tmp_path, max_backups=3)
+    _touch_backups(manager, [
+        "wiki_2024-01_backup_20240105000000.zim",
+        "wiki_2024-01_backup_20240104000000_1.zim",
+        "wiki_2024-01_backup_20240104000000.zim",
+        "wiki_2024-01_backup_20240103000000.zim",
+        "wiki_2024-01_backup_20240102000000.zim",
+    ])
+
+    manager.cleanup_old_backups()
+    assert sorted(os.listdir(manager.backup_dir)) == [
+        "wiki_2024-01_backup_20240104000000.zim",
+        "wiki_2024-01_backup_20240104000000_1.zim",
+        "wiki_2024-01_backup_20240105000000.zim",
+    ]
+
+
+def test_cleanup_within_limit_removes_nothing(tmp_path):
+    manager, source, data = _setup(tmp_path, max_backups=3)
+    names = ["wiki_2024-01_backup_20240102000000.zim", "wiki_2024-01_backup_20240103000000.zim"]
+    _touch_backups(manager, names)
+
+    manager.cleanup_old_backups()
+    assert sorted(os.listdir(manager.backup_dir)) == names
+
+
+def test_cleanup_ignores_files_that_are_not_backups(tmp_path):
+    manager, source, data = _setup(tmp_path, max_backups=1)
+    others = [
+        "notes.txt",
+        "wiki_2024-01_backup_2024010200000.zim",
+        "wiki_2024-01_backup_20240102000000.zim.tmp",
+        "wiki_2024-01_backup_20240102000000.zimx",
+    ]
+    _touch_backups(manager, others + [
+        "wiki_2024-01_backup_20240102000000.zim",
+        "wiki_2024-01_backup_20240103000000.zim",
+    ])
+
+    manager.cleanup_old_backups()
+    assert sorted(os.listdir(manager.backup_dir)) == sorted(others + ["wiki_2024-01_backup_20240103000000.zim"])
+
+
+def test_no_current_file_needs_no_backup(tmp_path):
+    manager, source, data = _setup(tmp_path)
+    source.unlink()
+
+    assert manager.backup_current_version()
+    assert os.listdir(manager.backup_dir) == []
+
+
+def test_backup_with_wrong_size_is_rejected(tmp_path, monkeypatch):
+    manager, source, data = _setup(tmp_path)
+
+    def short_copy(src, dst):
+        with open(dst, 'xb') as f:
+            f.write(data[:-1])
+        return 'copy'
+    monkeypatch.setattr(manager, "_link_or_copy", short_copy)
+    monkeypatch.setattr(manager, "_contents_match", lambda src, dst: pytest.fail("size mismatch compared"))
+
+    assert not manager.backup_current_version()
+    assert os.listdir(manager.backup_dir) == []
+
+
+def test_cleanup_prunes_many_backups_at_once(tmp_path):
+    manager, source, data = _setup(tmp_path, max_backups=5)
+    names = [f"wiki_2024-01_backup_202401{day:02d}000000.zim" for day in range(1, 29)]
+    _touch_backups(manager, list(reversed(names)))
+
+    manager.cleanup_old_backups()
+    assert sorted(os.listdir(manager.backup_dir)) == names[-5:]
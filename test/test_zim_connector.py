@@ -0,0 +1,205 @@
+import os
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from src.sources.zim.connector import ZimConnector
+
+
+class _Metrics:
+    def get_metric(self, name):
+        return None
+
+
+class _Metadata:
+    def __init__(self):
+        self.checksums = []
+
+    def update_download_checksum(self, filename, sha256):
+        self.checksums.append((filename, sha256))
+        return True
+
+
+class _DownloadManager:
+    def __init__(self, data_dir, remote="wiki_2024-02.zim", local=None, newer=True):
+        self.data_dir = data_dir
+        self.remote = remote
+        self.local = local
+        self.newer = newer
+        self.listings = 0
+        self.downloads = []
+
+    def get_latest_remote_file(self):
+        self.listings += 1
+        return self.remote, f"http://mirror/zim/{self.remote}"
+
+    def get_latest_local_file(self):
+        return self.local
+
+    def is_newer_version(self, remote_file):
+        return self.newer
+
+    def get_file_path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    def download_file(self, url, verify=None):
+        # Like the real manager, verify the complete temporary file before moving it into place
+        target = self.get_file_path(os.path.basename(url))
+        temp = f"{target}.downloading"
+        with open(temp, 'wb') as f:
+            f.write(b'zim')
+        self.downloads.append(url)
+        if verify is not None and not verify(temp):
+            os.remove(temp)
+            return False
+        os.replace(temp, target)
+        return True
+
+
+class _BackupManager:
+    def __init__(self):
+        self.backups = 0
+
+    def backup_current_version(self):
+        self.backups += 1
+        return True
+
+
+class _VerificationService:
+    def __init__(self, valid=True, sha256="ab" * 32):
+        self.valid = valid
+        self.sha256 = sha256
+        self.verified = []
+        self.checksummed = []
+
+    def verify_download(self, file_path):
+        self.verified.append(file_path)
+        return self.valid
+
+    def start_checksum(self, file_path):
+        self.checksummed.append(file_path)
+        future = Future()
+        if isinstance(self.sha256, Exception):
+            future.set_exception(self.sha256)
+        else:
+            future.set_result(self.sha256)
+        return future
+
+
+def _connector(tmp_path, parallel=True, record_sha256=False, **kwargs):
+    verification = kwargs.pop("verification", None) or _VerificationService()
+    return ZimConnector(None, _Metrics(), _Metadata(), _DownloadManager(str(tmp_path), **kwargs),
+                        _BackupManager(), verification, "wiki", parallel, record_sha256)
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_update_downloads_verified_file(tmp_path, parallel):
+    connector = _connector(tmp_path, parallel)
+
+    assert connector.update_if_needed()
+    assert (tmp_path / "wiki_2024-02.zim").exists()
+    assert connector.verification_service.verified == [str(tmp_path / "wiki_2024-02.zim.downloading")]
+    assert connector.backup_manager.backups == 1
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_rejected_download_does_not_replace_current_file(tmp_path, parallel):
+    connector = _connector(tmp_path, parallel, verification=_VerificationService(valid=False))
+
+    assert not connector.update_if_needed()
+    assert os.listdir(tmp_path) == []
+    assert connector.verification_service.checksummed == []
+    assert connector.wait_for_checksum()
+
+
+def test_checksum_is_off_by_default(tmp_path):
+    connector = _connector(tmp_path)
+
+    assert connector.update_if_needed()
+    assert connector.verification_service.checksummed == []
+    assert connector.wait_for_checksum()
+    assert connector.metadata_manager.checksums == []
+
+
+def test_checksum_is_recorded_when_collected(tmp_path):
+    connector = _connector(tmp_path, record_sha256=True)
+
+    assert connector.update_if_needed()
+    assert connector.verification_service.checksummed == [str(tmp_path / "wiki_2024-02.zim")]
+    assert connector.metadata_manager.checksums == []
+    assert connector.wait_for_checksum()
+    assert connector.metadata_manager.checksums == [("wiki_2024-02.zim", "ab" * 32)]
+    # Collected once only
+    assert connector.wait_for_checksum()
+    assert len(connector.metadata_manager.checksums) == 1
+
+
+def test_failed_checksum_does_not_fail_update(tmp_path):
+    connector = _connector(tmp_path, record_sha256=True, verification=_VerificationService(sha256=OSError("read error")))
+
+    assert connector.update_if_needed()
+    assert not connector.wait_for_checksum()
+    assert connector.metadata_manager.checksums == []
+
+
+def test_update_reuses_resolved_check(tmp_path):
+    connector = _connector(tmp_path)
+
+    assert connector.check_for_update()
+    assert connector.update_if_needed(already_checked=True)
+    assert connector.download_manager.listings == 1
+    assert connector.download_manager.downloads == ["http://mirror/zim/wiki_2024-02.zim"]
+
+
+def test_update_checks_once_by_itself(tmp_path):
+    connector = _connector(tmp_path)
+
+    assert connector.update_if_needed()
+    assert connector.download_manager.listings == 1
+
+
+def test_no_update_after_negative_check(tmp_path):
+    connector = _connector(tmp_path, local=str(tmp_path / "wiki_2024-02.zim"), newer=False)
+
+    assert not connector.check_for_update()
+    assert connector.update_if_needed(already_checked=True)
+    assert connector.download_manager.downloads == []
+    assert connector.backup_manager.backups == 0
+
+    # Forcing skips the version comparison
+    assert connector.update_if_needed(force=True)
+    assert connector.download_manager.downloads == ["http://mirror/zim/wiki_2024-02.zim"]
+
+
+def test_parallel_runs_backup_and_download_together(tmp_path):
+    connector = _connector(tmp_path, parallel=True)
+    download_started = threading.Event()
+    backup = connector.backup_manager.backup_current_version
+    download = connector.download_manager.download_file
+
+    def backup_during_download():
+        # Only returns once the download is running at the same time
+        assert download_started.wait(5)
+        return backup()
+
+    def download_file(url, verify=None):
+        download_started.set()
+        return download(url, verify)
+
+    connector.backup_manager.backup_current_version = backup_during_download
+    connector.download_manager.download_file = download_file
+
+    assert connector.update_if_needed()
+    assert connector.backup_manager.backups == 1
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_failed_backup_fails_update(tmp_path, parallel):
+    connector = _connector(tmp_path, parallel)
+    connector.backup_manager.backup_current_version = lambda: False
+
+    assert not connector.update_if_needed()
+    assert connector.verification_service.checksummed == []
+    # Run serially the download is not even started
+    assert len(connector.download_manager.downloads) == (1 if parallel else 0)
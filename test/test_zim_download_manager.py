@@ -0,0 +1,323 @@
+import io
+import os
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from src.sources.zim.implementations import zim_download_manager
+from src.sources.zim.implementations.zim_download_manager import ZimDownloadManager, _RangeNotHonored
+
+
+class _Metrics:
+    def get_metric(self, name):
+        return None
+
+
+class _Metadata:
+    def __init__(self):
+        self.downloads = []
+
+    def update_download_metadata(self, filename, file_size, etag=None, last_modified=None):
+        self.downloads.append((filename, file_size, etag, last_modified))
+        return True
+
+
+class _Raw(io.BytesIO):
+    decode_content = False
+
+
+class _Response:
+    def __init__(self, status_code, chunks, headers=None, fail_after=None, url=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.encoding = None
+        self.url = url
+        self.raw = _Raw(b''.join(chunks) if chunks and isinstance(chunks[0], bytes) else b'')
+        self._chunks = chunks
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for count, chunk in enumerate(self._chunks):
+            if self._fail_after is not None and count == self._fail_after:
+                raise Exception("connection reset")
+            yield chunk
+
+
+class _RangeSession:
+    """Answers range requests from an in-memory file, in small chunks."""
+
+    def __init__(self, data, chunk=100, status_code=206, fail=None):
+        self.data = data
+        self.chunk = chunk
+        self.status_code = status_code
+        # Range start -> number of chunks delivered before the connection drops
+        self.fail = fail or {}
+
+    def get(self, url, headers=None, **kwargs):
+        start, _, end = headers['Range'][len('bytes='):].partition('-')
+        start = int(start)
+        end = int(end) + 1 if end else len(self.data)
+        if self.status_code != 206:
+            start, end = 0, len(self.data)
+        body = self.data[start:end]
+        chunks = [body[i:i + self.chunk] for i in range(0, len(body), self.chunk)]
+        return _Response(self.status_code, chunks, fail_after=self.fail.get(start))
+
+
+class _HttpSession:
+    """Serves one remote file, honoring Range and If-Range like a real server."""
+
+    def __init__(self, data, etag, accept_ranges=True):
+        self.data = data
+        self.etag = etag
+        self.accept_ranges = accept_ranges
+        self.requests = []
+
+    def head(self, url, **kwargs):
+        headers = {'Content-Length': str(len(self.data)), 'ETag': self.etag}
+        if self.accept_ranges:
+            headers['Accept-Ranges'] = 'bytes'
+        return _Response(200, [], headers, url=url)
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append(headers)
+        if 'Range' in headers and headers.get('If-Range', self.etag) == self.etag:
+            start, _, end = headers['Range'][len('bytes='):].partition('-')
+            body = self.data[int(start):int(end) + 1 if end else len(self.data)]
+            status_code = 206
+        else:
+            body = self.data
+            status_code = 200
+        chunks = [body[i:i + 100] for i in range(0, len(body), 100)]
+        return _Response(status_code, chunks, {'Content-Length': str(len(body)), 'ETag': self.etag})
+
+
+class _ListingSession:
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        etag = self.headers.get('ETag')
+        if etag and self.requests[-1].get('If-None-Match') == etag:
+            return _Response(304, [])
+        return _Response(200, self.chunks, self.headers)
+
+
+def _manager(tmp_path, session=None):
+    manager = ZimDownloadManager("http://mirror/zim", r"wiki_\d{4}-\d{2}\.zim", str(tmp_path), _Metadata(), _Metrics(), "wiki")
+    if session is not None:
+        manager._session = session
+    return manager
+
+
+def _download_ranges(manager, path, data, resume_from=0):
+    manager._download_ranges("http://mirror/zim/wiki.zim", path, len(data), resume_from, '"e"', time.time())
+
+
+def test_resumable_size(tmp_path):
+    manager = _manager(tmp_path)
+    path = str(tmp_path / "wiki.zim.downloading")
+    assert manager._resumable_size(path, 1000) == 0
+
+    open(path, 'wb').close()
+    assert manager._resumable_size(path, 1000) == 0
+
+    with open(path, 'wb') as f:
+        f.write(b'x' * 400)
+    assert manager._resumable_size(path, 1000) == 400
+    assert manager._resumable_size(path, 0) == 400
+    # A file as large as the remote one may be a preallocated, unfinished one
+    assert manager._resumable_size(path, 400) == 0
+    assert manager._resumable_size(path, 300) == 0
+
+
+def test_ranges_download_whole_file(tmp_path):
+    data = os.urandom(8000)
+    path = str(tmp_path / "wiki.zim.downloading")
+    _download_ranges(_manager(tmp_path, _RangeSession(data)), path, data)
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_ranges_resume_after_prefix(tmp_path):
+    data = os.urandom(8000)
+    path = str(tmp_path / "wiki.zim.downloading")
+    with open(path, 'wb') as f:
+        f.write(data[:3000])
+    _download_ranges(_manager(tmp_path, _RangeSession(data)), path, data, resume_from=3000)
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_ranges_failure_keeps_contiguous_prefix(tmp_path):
+    data = os.urandom(8000)
+    path = str(tmp_path / "wiki.zim.downloading")
+    # The first segment (bytes 0-999) drops after three 100 byte chunks
+    manager = _manager(tmp_path, _RangeSession(data, fail={0: 3}))
+    with pytest.raises(Exception):
+        _download_ranges(manager, path, data)
+
+    # Later segments may be complete, but nothing past the gap can be trusted
+    assert os.path.getsize(path) == 300
+    assert manager._resumable_size(path, len(data)) == 300
+    with open(path, 'rb') as f:
+        assert f.read() == data[:300]
+
+
+def test_ranges_not_honored_keeps_resumed_prefix(tmp_path):
+    data = os.urandom(8000)
+    path = str(tmp_path / "wiki.zim.downloading")
+    with open(path, 'wb') as f:
+        f.write(data[:2000])
+    manager = _manager(tmp_path, _RangeSession(data, status_code=200))
+    with pytest.raises(_RangeNotHonored):
+        _download_ranges(manager, path, data, resume_from=2000)
+
+    with open(path, 'rb') as f:
+        assert f.read() == data[:2000]
+
+
+def _listing(names):
+    return ''.join(f'<tr><td><a href="{name}">{name}</a></td><td>2024</td></tr>\n' for name in names)
+
+
+def test_listing_parse_across_chunk_boundaries(tmp_path):
+    names = ["wiki_2023-11.zim", "other_2025-01.zim", "wiki_2024-03.zim", "wiki_2024-02.zim"]
+    page = _listing(names)
+    latest_offset = page.index('href="wiki_2024-03.zim"')
+
+    # Split the page at every offset around the latest href, so each part of it meets a boundary
+    for split in range(latest_offset - 2, latest_offset + len('href="wiki_2024-03.zim"') + 2):
+        manager = _manager(tmp_path, _ListingSession([page[:split], page[split:]]))
+        assert manager.get_latest_remote_file() == ("wiki_2024-03.zim", "http://mirror/zim/wiki_2024-03.zim")
+
+
+def test_listing_parse_with_small_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_download_manager, "_LISTING_OVERLAP", 64)
+    names = [f"wiki_20{year:02d}-{month:02d}.zim" for year in range(10, 25) for month in range(1, 13)]
+    page = _listing(reversed(names))
+    chunks = [page[i:i + 7] for i in range(0, len(page), 7)]
+
+    manager = _manager(tmp_path, _ListingSession(chunks))
+    assert manager.get_latest_remote_file()[0] == "wiki_2024-12.zim"
+
+
+def test_listing_no_match(tmp_path):
+    manager = _manager(tmp_path, _ListingSession([_listing(["other_2024-01.zim"])]))
+    assert manager.get_latest_remote_file() == (None, None)
+
+
+def test_listing_not_modified_reuses_result(tmp_path):
+    session = _ListingSession([_listing(["wiki_2024-01.zim"])], {'ETag': '"l1"'})
+    manager = _manager(tmp_path, session)
+    first = manager.get_latest_remote_file()
+    assert first[0] == "wiki_2024-01.zim"
+
+    assert manager.get_latest_remote_file() == first
+    assert session.requests[1].get('If-None-Match') == '"l1"'
+
+
+def _partial(tmp_path, data, validator=None):
+    path = tmp_path / "wiki_2024-01.zim.downloading"
+    path.write_bytes(data)
+    if validator is not None:
+        (tmp_path / "wiki_2024-01.zim.downloading.validator").write_text(validator)
+    return path
+
+
+def _small_ranges(monkeypatch):
+    # Makes an 8000 byte file large enough for the parallel ranged download
+    monkeypatch.setattr(zim_download_manager, "_DOWNLOAD_CHUNK", 100)
+
+
+@pytest.mark.parametrize("ranges", [False, True])
+def test_download_resumes_partial_of_same_file(tmp_path, monkeypatch, ranges):
+    _small_ranges(monkeypatch)
+    data = os.urandom(8000)
+    _partial(tmp_path, data[:500], '"v1"')
+    session = _HttpSession(data, '"v1"', accept_ranges=ranges)
+    manager = _manager(tmp_path, session)
+
+    assert manager.download_file("http://mirror/zim/wiki_2024-01.zim")
+    assert (tmp_path / "wiki_2024-01.zim").read_bytes() == data
+    assert all(r.get('If-Range') == '"v1"' for r in session.requests)
+    assert session.requests[0]['Range'].startswith('bytes=500-')
+    assert sorted(os.listdir(tmp_path)) == ["wiki_2024-01.zim"]
+
+
+@pytest.mark.parametrize("ranges", [False, True])
+def test_download_discards_partial_of_changed_file(tmp_path, monkeypatch, ranges):
+    _small_ranges(monkeypatch)
+    old = os.urandom(8000)
+    new = os.urandom(8000)
+    _partial(tmp_path, old[:4000], '"v1"')
+    manager = _manager(tmp_path, _HttpSession(new, '"v2"', accept_ranges=ranges))
+
+    assert manager.download_file("http://mirror/zim/wiki_2024-01.zim")
+    assert (tmp_path / "wiki_2024-01.zim").read_bytes() == new
+    assert manager.metadata_manager.downloads == [("wiki_2024-01.zim", 8000, '"v2"', None)]
+
+
+@pytest.mark.parametrize("ranges", [False, True])
+def test_download_without_saved_validator_starts_over(tmp_path, monkeypatch, ranges):
+    _small_ranges(monkeypatch)
+    data = os.urandom(8000)
+    _partial(tmp_path, b'x' * 4000)
+    manager = _manager(tmp_path, _HttpSession(data, '"v1"', accept_ranges=ranges))
+
+    assert manager.download_file("http://mirror/zim/wiki_2024-01.zim")
+    # Resuming would have kept the stale first 4000 bytes
+    assert (tmp_path / "wiki_2024-01.zim").read_bytes() == data
+
+
+def test_failed_download_keeps_validator_for_resume(tmp_path, monkeypatch):
+    _small_ranges(monkeypatch)
+    data = os.urandom(8000)
+    manager = _manager(tmp_path, _RangeSession(data, fail={0: 3}))
+    manager._session.head = _HttpSession(data, '"v1"').head
+
+    assert not manager.download_file("http://mirror/zim/wiki_2024-01.zim")
+    assert (tmp_path / "wiki_2024-01.zim.downloading").read_bytes() == data[:300]
+    assert (tmp_path / "wiki_2024-01.zim.downloading.validator").read_text() == '"v1"'
+    assert manager.get_latest_local_file() is None
+
+
+def test_rejected_download_is_discarded_and_not_recorded(tmp_path):
+    data = os.urandom(8000)
+    (tmp_path / "wiki_2023-12.zim").write_bytes(b'current')
+    manager = _manager(tmp_path, _HttpSession(data, '"v1"', accept_ranges=False))
+    checked = []
+
+    def reject(path):
+        checked.append((path, open(path, 'rb').read()))
+        return False
+
+    assert not manager.download_file("http://mirror/zim/wiki_2024-01.zim", reject)
+    assert checked == [(str(tmp_path / "wiki_2024-01.zim.downloading"), data)]
+    assert sorted(os.listdir(tmp_path)) == ["wiki_2023-12.zim"]
+    assert manager.metadata_manager.downloads == []
+
+
+def test_accepted_download_is_moved_into_place(tmp_path):
+    data = os.urandom(8000)
+    manager = _manager(tmp_path, _HttpSession(data, '"v1"', accept_ranges=False))
+
+    assert manager.download_file("http://mirror/zim/wiki_2024-01.zim", lambda path: True)
+    assert (tmp_path / "wiki_2024-01.zim").read_bytes() == data
+    assert manager.metadata_manager.downloads == [("wiki_2024-01.zim", 8000, '"v1"', None)]
@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+
+from src.sources.zim.implementations import zim_metadata_manager
+from src.sources.zim.implementations.zim_metadata_manager import ZimMetadataManager
+
+
+def _manager(tmp_path):
+    return ZimMetadataManager(str(tmp_path), source_name="wiki")
+
+
+def _pointer(manager):
+    with open(manager.latest_version_file) as f:
+        return f.read().partition('\n')
+
+
+def test_append_goes_to_journal_and_replays(tmp_path):
+    manager = _manager(tmp_path)
+    assert manager.update_download_metadata("wiki_2024-01.zim", 100, etag='"a"')
+    assert manager.update_download_metadata("wiki_2024-02.zim", 200)
+    assert not os.path.exists(manager.metadata_file)
+    with open(manager.journal_file) as f:
+        assert len(f.readlines()) == 2
+
+    # A fresh manager has no cache and must rebuild the state from the journal
+    metadata = _manager(tmp_path).load_metadata()
+    assert len(metadata) == 1
+    assert metadata[0]["source_name"] == "wiki"
+    assert metadata[0]["latest_version"] == "2024-02"
+    assert [r["filename"] for r in metadata[0]["downloads"]] == ["wiki_2024-01.zim", "wiki_2024-02.zim"]
+    assert metadata[0]["downloads"][0]["etag"] == '"a"'
+
+
+def test_checksum_applies_to_recorded_download(tmp_path):
+    manager = _manager(tmp_path)
+    assert not manager.update_download_checksum("wiki_2024-01.zim", "00" * 32)
+    assert manager.update_download_metadata("wiki_2024-01.zim", 100)
+    assert manager.update_download_checksum("wiki_2024-01.zim", "ab" * 32)
+
+    downloads = _manager(tmp_path).load_metadata()[0]["downloads"]
+    assert downloads[0]["sha256"] == "ab" * 32
+
+
+def test_save_folds_journal_into_snapshot(tmp_path):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    assert manager.save_metadata(manager.load_metadata())
+    assert not os.path.exists(manager.journal_file)
+
+    with open(manager.metadata_file) as f:
+        assert json.load(f)[0]["latest_version"] == "2024-01"
+    manager.update_download_metadata("wiki_2024-02.zim", 200)
+    assert _manager(tmp_path).load_metadata()[0]["latest_version"] == "2024-02"
+
+
+def test_replay_is_idempotent(tmp_path):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    manager.update_download_checksum("wiki_2024-01.zim", "ab" * 32)
+    leftover = str(tmp_path / "journal.copy")
+    shutil.copy(manager.journal_file, leftover)
+
+    # A crash between writing the snapshot and removing the journal leaves both behind
+    manager.save_metadata(manager.load_metadata())
+    shutil.copy(leftover, manager.journal_file)
+
+    downloads = _manager(tmp_path).load_metadata()[0]["downloads"]
+    assert len(downloads) == 1
+    assert downloads[0]["sha256"] == "ab" * 32
+
+
+def test_torn_journal_line_is_skipped_and_repaired(tmp_path):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    with open(manager.journal_file, 'a') as f:
+        f.write('{"op":"download","source_na')
+
+    assert _manager(tmp_path).load_metadata()[0]["latest_version"] == "2024-01"
+
+    # The next append starts on a fresh line, so it is not glued to the torn one
+    _manager(tmp_path).update_download_metadata("wiki_2024-02.zim", 200)
+    metadata = _manager(tmp_path).load_metadata()
+    assert metadata[0]["latest_version"] == "2024-02"
+    assert len(metadata[0]["downloads"]) == 2
+
+
+def test_journal_is_compacted_when_it_outgrows_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_metadata_manager, "_COMPACT_MIN_SNAPSHOT_BYTES", 64)
+    manager = _manager(tmp_path)
+
+    month = 0
+    while not os.path.exists(manager.metadata_file):
+        month += 1
+        manager.update_download_metadata(f"wiki_2024-{month:02d}.zim", month)
+        assert month < 12
+
+    assert not os.path.exists(manager.journal_file)
+    metadata = _manager(tmp_path).load_metadata()
+    assert len(metadata[0]["downloads"]) == month
+    assert metadata[0]["latest_version"] == f"2024-{month:02d}"
+
+
+def test_pointer_is_trusted_for_exact_metadata_state(tmp_path):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    version, _, key = _pointer(manager)
+    assert version == "2024-01"
+    assert key == manager._format_stat_key(manager._current_stat_key())
+
+    # A matching pointer answers without reading the metadata
+    with open(manager.latest_version_file, 'w') as f:
+        f.write(f"2099-12\n{key}")
+    assert _manager(tmp_path).get_latest_version() == "2099-12"
+
+
+def test_cache_answers_before_pointer(tmp_path, monkeypatch):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    manager.load_metadata()
+
+    # A warm cache for unchanged files needs neither the pointer nor the metadata files
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: opened.append(args[0]) or real_open(*args, **kwargs))
+    assert manager.get_latest_version() == "2024-01"
+    assert opened == []
+
+
+def test_pointer_is_ignored_after_metadata_changes(tmp_path):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    manager.save_metadata(manager.load_metadata())
+    old_snapshot = str(tmp_path / "snapshot.copy")
+    shutil.copy2(manager.metadata_file, old_snapshot)
+
+    manager.update_download_metadata("wiki_2024-02.zim", 200)
+    manager.save_metadata(manager.load_metadata())
+    assert manager.get_latest_version() == "2024-02"
+
+    # Restoring an older snapshot must not be hidden by the pointer written for the newer one
+    shutil.copy2(old_snapshot, manager.metadata_file)
+    os.utime(manager.metadata_file, ns=(1, 1))
+    assert _manager(tmp_path).get_latest_version() == "2024-01"
+    # Reads never rewrite the pointer
+    assert _pointer(manager)[0] == "2024-02"
+
+
+def test_pointer_without_metadata_means_no_version(tmp_path):
+    manager = _manager(tmp_path)
+    manager.update_download_metadata("wiki_2024-01.zim", 100)
+    os.remove(manager.journal_file)
+
+    assert os.path.exists(manager.latest_version_file)
+    assert _manager(tmp_path).get_latest_version() is None
+    assert _manager(tmp_path).load_metadata() == []
@@ -0,0 +1,80 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.sources.zim.implementations.zim_verification_service import ZimVerificationService, _ZIM_HEADER, _ZIM_MAGIC
+
+
+def _zim_bytes(body_size=4096, magic=_ZIM_MAGIC, cluster_count=1, checksum_pos=None):
+    body = os.urandom(body_size)
+    if checksum_pos is None:
+        checksum_pos = _ZIM_HEADER.size + body_size
+    header = _ZIM_HEADER.pack(magic, 6, 1, b'\0' * 16, 1, cluster_count, 0, 0, 0, 0, 0, 0, checksum_pos)
+    data = header + body
+    return data + hashlib.md5(data[:checksum_pos]).digest()
+
+
+def _write(tmp_path, data, name="wiki_2024-01.zim"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_valid_file_passes(tmp_path):
+    assert ZimVerificationService().verify_download(_write(tmp_path, _zim_bytes()))
+    assert ZimVerificationService(verify_checksum=True).verify_download(_write(tmp_path, _zim_bytes()))
+
+
+def test_missing_and_empty_files_fail(tmp_path):
+    service = ZimVerificationService()
+    assert not service.verify_download(str(tmp_path / "missing.zim"))
+    assert not service.verify_download(_write(tmp_path, b''))
+
+
+@pytest.mark.parametrize("data", [
+    _zim_bytes(magic=0x12345678),
+    _zim_bytes(cluster_count=0),
+    b'not a zim file',
+])
+def test_invalid_header_fails(tmp_path, data):
+    assert not ZimVerificationService().verify_download(_write(tmp_path, data))
+
+
+def test_truncated_file_fails(tmp_path):
+    data = _zim_bytes()
+    assert not ZimVerificationService().verify_download(_write(tmp_path, data[:len(data) - 100]))
+
+
+def test_corruption_is_found_only_with_checksum(tmp_path):
+    data = bytearray(_zim_bytes())
+    data[200] ^= 0xff
+    path = _write(tmp_path, bytes(data))
+
+    assert ZimVerificationService().verify_download(path)
+    assert not ZimVerificationService(verify_checksum=True).verify_download(path)
+
+
+def test_partial_download_name_is_not_flagged(tmp_path, caplog):
+    path = _write(tmp_path, _zim_bytes(), "wiki_2024-01.zim.downloading")
+    with caplog.at_level(logging.WARNING):
+        assert ZimVerificationService().verify_download(path)
+    assert not caplog.records
+
+
+def test_checksum_inline_and_on_executor(tmp_path):
+    data = _zim_bytes()
+    path = _write(tmp_path, data)
+    expected = hashlib.sha256(data).hexdigest()
+
+    assert ZimVerificationService().start_checksum(path).result() == expected
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert ZimVerificationService(checksum_executor=executor).start_checksum(path).result() == expected
+
+
+def test_checksum_failure_is_reported_by_future(tmp_path):
+    future = ZimVerificationService().start_checksum(str(tmp_path / "missing.zim"))
+    with pytest.raises(FileNotFoundError):
+        future.result()